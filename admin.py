@@ -0,0 +1,264 @@
+import time
+from datetime import datetime, timedelta
+from flask import current_app, redirect, url_for, request, flash, Response, stream_with_context
+from flask_admin import Admin, BaseView, expose
+from flask_admin.actions import action
+from flask_admin.contrib.sqla import ModelView
+from flask_admin.contrib.sqla.filters import FloatGreaterFilter, FloatSmallerFilter
+from flask_login import current_user
+from flask_wtf import FlaskForm
+from wtforms import DateField, HiddenField, IntegerField, SelectField, StringField, SubmitField
+from wtforms.validators import DataRequired, Optional, ValidationError
+from cache import user_directory
+from events import queue_task_event, queue_task_update, task_delta
+from exports import EXPORTS, FORMATS
+from models import User, Task, db
+from rollups import adjust_rollups, rollup_values, hours_report
+from search import matching_task_ids
+from tasks.forms import PRIORITY_CHOICES
+
+class CachedCount:
+    """Stands in for a view's unfiltered COUNT query and answers it from a short-lived cache.
+
+    Applying a search or filter goes through the real query (any attribute
+    other than scalar is delegated to it), so filtered counts stay exact.
+    """
+
+    def __init__(self, query, view):
+        self._query = query
+        self._view = view
+
+    def scalar(self):
+        return self._view.cached_count(self._query)
+
+    def __getattr__(self, name):
+        return getattr(self._query, name)
+
+def estimated_count(table):
+    """The planner's row estimate for a table on PostgreSQL, or None where there is none."""
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return None
+    estimate = db.session.execute(
+        db.text('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:name)'), {'name': table.name}
+    ).scalar()
+    return estimate if estimate is not None and estimate >= 0 else None
+
+class AdminAccess:
+    """Restricts an admin view to the admin user."""
+
+    def is_accessible(self):
+        # Customize access control (e.g., only admin can access)
+        return current_user.is_authenticated and current_user.username == 'admin'
+
+    def inaccessible_callback(self, name, **kwargs):
+        flash("You do not have permission to access this page.", "danger")
+        return redirect(url_for('auth.login', next=request.url))
+
+class AdminModelView(AdminAccess, ModelView):
+    """Base for the admin model views: admin-only access and cheap list counts.
+
+    The unfiltered row count behind the pager is cached for
+    ADMIN_COUNT_CACHE_TTL seconds, and above ADMIN_EXACT_COUNT_LIMIT rows the
+    database's estimate is used where it keeps one, instead of a COUNT(*)
+    on every page.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._count_cache = None  # (expires, count)
+
+    def get_count_query(self):
+        return CachedCount(super().get_count_query(), self)
+
+    def cached_count(self, query):
+        cached = self._count_cache
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        count = estimated_count(self.model.__table__)
+        if count is None or count < current_app.config['ADMIN_EXACT_COUNT_LIMIT']:
+            count = query.scalar()
+        self._count_cache = (time.monotonic() + current_app.config['ADMIN_COUNT_CACHE_TTL'], count)
+        return count
+
+    def forget_count(self):
+        self._count_cache = None
+
+    def after_model_change(self, form, model, is_created):
+        self.forget_count()
+
+    def after_model_delete(self, model):
+        self.forget_count()
+
+# Custom ModelView for User
+class UserModelView(AdminModelView):
+    column_list = ('id', 'username', 'email', 'first_name', 'last_name', 'department', 'status', 'date_created')
+    column_searchable_list = ('username', 'email', 'first_name', 'last_name')
+    column_filters = ('status', 'department')
+    column_editable_list = ('status', 'department')
+    form_columns = ('username', 'email', 'password_hash', 'first_name', 'middle_name', 'last_name', 'department',
+                    'phone_number', 'address', 'status', 'profile_picture')
+
+class BulkReassignForm(FlaskForm):
+    ids = HiddenField()
+    assignee_id = IntegerField('Assignee ID (leave empty to unassign)', validators=[Optional()])
+    submit = SubmitField('Reassign')
+
+    def validate_assignee_id(form, field):
+        if field.data is not None and user_directory().get(field.data) is None:
+            raise ValidationError('Unknown assignee.')
+
+class BulkPriorityForm(FlaskForm):
+    ids = HiddenField()
+    priority = SelectField('Priority', choices=PRIORITY_CHOICES, validators=[DataRequired()])
+    submit = SubmitField('Change priority')
+
+def username_of(view, context, model, name):
+    user = getattr(model, name)
+    return user.username if user else ''
+
+# Custom ModelView for Task
+class TaskModelView(AdminModelView):
+    column_list = ('id', 'title', 'description', 'priority', 'due_date', 'task_type', 'creator', 'assignee', 'date_created', 'start_time', 'end_time', 'status', 'duration_seconds')
+    column_labels = {'duration_seconds': 'Duration (s)'}
+    column_formatters = {'creator': username_of, 'assignee': username_of}
+    # Status is an indexed column and the duration a SQL expression, so both sort in the database
+    column_sortable_list = ('id', 'title', 'priority', 'due_date', 'task_type', 'date_created',
+                            'start_time', 'end_time', 'status', ('duration_seconds', Task.duration_seconds))
+    column_searchable_list = ('title', 'description')
+    column_filters = ('priority', 'task_type', 'user_id', 'status',  # Ensure these attributes exist in the model
+                      FloatGreaterFilter(Task.duration_seconds, 'Duration (s)'),
+                      FloatSmallerFilter(Task.duration_seconds, 'Duration (s)'))
+    form_columns = ('title', 'description', 'priority', 'due_date', 'task_type', 'user_id', 'assignee_id', 'start_time', 'end_time')
+
+    def get_query(self):
+        # Load creator and assignee with the page rather than one query per row
+        return super().get_query().options(db.joinedload(Task.creator), db.joinedload(Task.assignee))
+
+    def _apply_search(self, query, count_query, joins, count_joins, search):
+        # Use the full-text index instead of LIKE '%term%' scans over title and description
+        criterion = Task.id.in_(matching_task_ids(search))
+        if count_query is not None:
+            count_query = count_query.filter(criterion)
+        return query.filter(criterion), count_query, joins, count_joins
+
+    # Bulk actions run one set-based statement for all selected rows. They
+    # bypass the ORM, so they record rollup changes and live-update events
+    # themselves, like the other bulk paths.
+
+    @action('delete', 'Delete', 'Are you sure you want to delete selected records?')
+    def action_delete(self, ids):
+        deleted = db.session.execute(
+            db.delete(Task).where(Task.id.in_(self._task_ids(ids)))
+            .returning(Task.id, Task.user_id, Task.assignee_id, Task.start_time, Task.end_time)
+            .execution_options(synchronize_session=False)
+        ).all()
+        adjust_rollups(db.session, [(rollup_values(row), None) for row in deleted])
+        for row in deleted:
+            queue_task_event(db.session, 'deleted', {'id': row.id}, (row.user_id, row.assignee_id))
+        db.session.commit()
+        self.forget_count()
+        flash(f'{len(deleted)} task(s) deleted.', 'success')
+
+    @action('reassign', 'Reassign')
+    def action_reassign(self, ids):
+        return redirect(url_for('.bulk_reassign', ids=','.join(ids)))
+
+    @action('priority', 'Change priority')
+    def action_priority(self, ids):
+        return redirect(url_for('.bulk_priority', ids=','.join(ids)))
+
+    @expose('/bulk/reassign/', methods=('GET', 'POST'))
+    def bulk_reassign(self):
+        form = BulkReassignForm(ids=request.args.get('ids', ''))
+        if form.validate_on_submit():
+            task_ids = self._task_ids(form.ids.data.split(','))
+            assignee_id = form.assignee_id.data
+            before = db.session.execute(
+                db.select(Task.id, Task.user_id, Task.assignee_id, Task.start_time, Task.end_time)
+                .where(Task.id.in_(task_ids))
+            ).all()
+            db.session.execute(db.update(Task).where(Task.id.in_(task_ids)).values(assignee_id=assignee_id)
+                               .execution_options(synchronize_session=False))
+            adjust_rollups(db.session, [(rollup_values(row), (row.user_id, assignee_id, row.start_time, row.end_time))
+                                        for row in before])
+            for row in before:
+                queue_task_update(db.session, task_delta({'id': row.id, 'assignee_id': assignee_id}),
+                                  row.user_id, assignee_id, row.assignee_id)
+            db.session.commit()
+            flash(f'{len(before)} task(s) reassigned.', 'success')
+            return redirect(url_for('.index_view'))
+        return self.render('admin/task_bulk.html', form=form, title='Reassign tasks')
+
+    @expose('/bulk/priority/', methods=('GET', 'POST'))
+    def bulk_priority(self):
+        form = BulkPriorityForm(ids=request.args.get('ids', ''))
+        if form.validate_on_submit():
+            changed = db.session.execute(
+                db.update(Task).where(Task.id.in_(self._task_ids(form.ids.data.split(','))))
+                .values(priority=form.priority.data)
+                .returning(Task.id, Task.user_id, Task.assignee_id)
+                .execution_options(synchronize_session=False)
+            ).all()
+            for row in changed:
+                queue_task_event(db.session, 'updated', {'id': row.id, 'priority': form.priority.data},
+                                 (row.user_id, row.assignee_id))
+            db.session.commit()
+            flash(f'{len(changed)} task(s) changed to {form.priority.data} priority.', 'success')
+            return redirect(url_for('.index_view'))
+        return self.render('admin/task_bulk.html', form=form, title='Change priority')
+
+    @staticmethod
+    def _task_ids(ids):
+        return [int(task_id) for task_id in ids if str(task_id).isdigit()]
+
+# Weekly hours per department and user, read from the rollup table
+class HoursReportView(AdminAccess, BaseView):
+    @expose('/')
+    def index(self):
+        try:
+            week = datetime.strptime(request.args.get('week', ''), '%Y-%m-%d').date()
+        except ValueError:
+            week = datetime.utcnow().date()
+        week -= timedelta(days=week.weekday())  # Weeks start on Monday
+        return self.render('admin/hours_report.html', week=week, rows=hours_report(week),
+                           previous_week=week - timedelta(days=7), next_week=week + timedelta(days=7))
+
+class ExportForm(FlaskForm):
+    # Read from the query string, so there is no CSRF token to check
+    class Meta:
+        csrf = False
+
+    dataset = SelectField('Data', choices=[('tasks', 'Tasks'), ('users', 'Users')])
+    format = SelectField('Format', choices=[('csv', 'CSV'), ('ndjson', 'NDJSON')])
+    since = DateField('Created from', validators=[Optional()])
+    until = DateField('Created until', validators=[Optional()])
+    department = StringField('Department', validators=[Optional()])
+    assignee_id = IntegerField('Assignee ID (tasks only)', validators=[Optional()])
+
+# Streams tasks or users as CSV or NDJSON without holding the result in memory
+class ExportView(AdminAccess, BaseView):
+    @expose('/')
+    def index(self):
+        form = ExportForm(formdata=request.args)
+        if not request.args or not form.validate():
+            return self.render('admin/export.html', form=form)
+
+        rows = EXPORTS[form.dataset.data](since=form.since.data, until=form.until.data,
+                                          department=form.department.data or None,
+                                          assignee_id=form.assignee_id.data)
+        encode, mimetype = FORMATS[form.format.data]
+        filename = f"{form.dataset.data}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{form.format.data}"
+        # The session stays open while the generator pulls batches from the cursor
+        return Response(stream_with_context(encode(rows)), mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+def init_admin(app):
+    """Create the Flask-Admin interface and register its views."""
+    admin = Admin(app, name='Admin Dashboard', template_mode='bootstrap4')
+
+    # Add custom model views to the admin
+    admin.add_view(UserModelView(User, db.session))
+    admin.add_view(TaskModelView(Task, db.session))
+    admin.add_view(HoursReportView(name='Hours', endpoint='hours'))
+    admin.add_view(ExportView(name='Export', endpoint='export'))
+    return admin
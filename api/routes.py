@@ -0,0 +1,280 @@
+from datetime import datetime
+from flask import jsonify, request, abort, current_app, make_response
+from flask_login import current_user
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException
+from models import Task, TaskState, db
+from tasks.forms import TaskForm, TaskFilterForm
+from tasks.routes import encode_cursor, decode_cursor, task_criteria, task_sort, queue_stamped
+from events import queue_task_event, queue_task_update, task_delta
+from search import search_tasks
+from rollups import adjust_rollups, rollup_values, ROLLUP_FIELDS
+from . import api
+
+# JSON field name -> TaskForm field that validates it
+TASK_FIELDS = {
+    'title': 'task_title',
+    'description': 'task_description',
+    'priority': 'priority',
+    'task_type': 'task_type',
+    'due_date': 'due_date',  # YYYY-MM-DD
+    'start_time': 'start_time',  # YYYY-MM-DDTHH:MM
+    'end_time': 'end_time',  # YYYY-MM-DDTHH:MM
+    'assignee_id': 'assignee_id',
+}
+FORM_FIELDS = {form_name: name for name, form_name in TASK_FIELDS.items()}
+
+@api.before_request
+def require_login():
+    # JSON clients get a 401 instead of a redirect to the login page
+    if not current_user.is_authenticated:
+        return jsonify(error='Authentication required.'), 401
+
+@api.errorhandler(HTTPException)
+def json_error(error):
+    return jsonify(error=error.description), error.code
+
+def task_values(data, task=None):
+    """Validate one JSON task with the same rules as TaskForm.
+
+    Returns (values, errors): model column values for the fields that were
+    sent (plus the status they imply), or the validation errors keyed by JSON
+    field name. When patching
+    `task`, fields that are not sent keep their current values.
+    """
+    if not isinstance(data, dict):
+        return None, {'task': ['Expected a JSON object.']}
+    unknown = sorted(set(data) - set(TASK_FIELDS) - {'id'})
+    if unknown:
+        return None, {name: ['Unknown field.'] for name in unknown}
+
+    formdata = MultiDict()
+    if task is not None:
+        # Required fields fall back to the stored values
+        formdata.update({'task_title': task.title, 'priority': task.priority, 'task_type': task.task_type})
+    for name, value in data.items():
+        if name in TASK_FIELDS and value is not None:
+            formdata[TASK_FIELDS[name]] = str(value)
+
+    form = TaskForm(formdata=formdata, meta={'csrf': False})
+    if not form.validate():
+        return None, {FORM_FIELDS.get(name, name): errors for name, errors in form.errors.items()}
+    sent = TASK_FIELDS if task is None else [name for name in TASK_FIELDS if name in data]
+    values = {name: form[TASK_FIELDS[name]].data for name in sent}
+    # Batch statements bypass the ORM hook that derives the status
+    if task is None or 'start_time' in values or 'end_time' in values:
+        times = {name: values.get(name, getattr(task, name, None)) for name in ('start_time', 'end_time')}
+        # The form only compares the times it was sent; a patch may move one past the stored other
+        if times['start_time'] and times['end_time'] and times['end_time'] < times['start_time']:
+            field = 'end_time' if 'end_time' in values else 'start_time'
+            return None, {field: ['End time cannot be before start time.']}
+        values['status'] = TaskState.for_times(**times).value
+    return values, None
+
+def can_modify(task):
+    """Only the creator or the assignee may change a task."""
+    return current_user.id in (task.user_id, task.assignee_id)
+
+def get_task_or_abort(task_id):
+    task = db.get_or_404(Task, task_id)
+    if not can_modify(task):
+        abort(403)  # Forbidden if the user is not the creator or assignee
+    return task
+
+def patch_id(item):
+    """The task id a batch patch item names, or None when the item is not an object."""
+    return item.get('id') if isinstance(item, dict) else None
+
+def is_task_id(value):
+    # JSON true/false decode to bools, which Python counts as ints
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def batch_items(key, id_of=None):
+    """Return the list under `key` in the JSON body, enforcing API_BATCH_LIMIT.
+
+    With `id_of`, every item must name a distinct integer task id, as
+    `id_of(item)` returns it; otherwise the whole batch is refused with a 400
+    listing the offending items.
+    """
+    payload = request.get_json(silent=True)
+    items = payload.get(key) if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        abort(400, f'Expected a JSON object with a "{key}" list.')
+    if len(items) > current_app.config['API_BATCH_LIMIT']:
+        abort(413, f"At most {current_app.config['API_BATCH_LIMIT']} items per batch.")
+    if id_of is not None:
+        invalid, seen = [], set()
+        for index, item in enumerate(items):
+            task_id = id_of(item)
+            if not is_task_id(task_id):
+                invalid.append({'index': index, 'status': 'invalid', 'errors': {'id': ['Expected an integer id.']}})
+            elif task_id in seen:
+                # A repeat would apply its rollup change and events twice
+                invalid.append({'index': index, 'status': 'invalid', 'errors': {'id': ['Duplicate id.']}})
+            else:
+                seen.add(task_id)
+        if invalid:
+            abort(make_response(jsonify(results=invalid), 400))
+    return items
+
+def queue_updated(task, values):
+    """Record the rollup change and live-update events for a bulk patch of `task` (which bypasses the ORM)."""
+    assignee_id = values.get('assignee_id', task.assignee_id)
+    updated = tuple(values.get(name, getattr(task, name)) for name in ROLLUP_FIELDS)
+    adjust_rollups(db.session, [(rollup_values(task), updated)])
+    queue_task_update(db.session, task_delta(dict(values, id=task.id)), task.user_id, assignee_id, task.assignee_id)
+
+@api.route('/tasks', methods=['GET'])
+def list_tasks():
+    """One keyset page of the current user's tasks, filtered like the dashboard."""
+    filter_form = TaskFilterForm(formdata=request.args)
+    if not filter_form.validate():
+        return jsonify(errors=filter_form.errors), 400
+    after = request.args.get('after')
+    limit = request.args.get('limit', current_app.config['TASKS_PER_PAGE'], type=int)
+    limit = max(1, min(limit, current_app.config['API_PAGE_LIMIT']))
+
+    user_tasks, next_cursor = Task.page_visible_to(
+        current_user.id, limit, after=decode_cursor(after, filter_form.sort.data) if after else None,
+        criteria=task_criteria(filter_form), sort=task_sort(filter_form)
+    )
+    return jsonify(tasks=[task.to_dict() for task in user_tasks],
+                   next=encode_cursor(next_cursor) if next_cursor else None)
+
+@api.route('/tasks/search', methods=['GET'])
+def find_tasks():
+    """Tasks the user can see that match `q`, ranked by relevance."""
+    limit = request.args.get('limit', current_app.config['TASKS_PER_PAGE'], type=int)
+    limit = max(1, min(limit, current_app.config['API_PAGE_LIMIT']))
+    matches = search_tasks(request.args.get('q', ''), current_user.id, limit)
+    return jsonify(tasks=[task.to_dict() for task in matches])
+
+@api.route('/tasks/<int:task_id>', methods=['GET'])
+def get_task(task_id):
+    return jsonify(get_task_or_abort(task_id).to_dict())
+
+@api.route('/tasks', methods=['POST'])
+def create_task():
+    values, errors = task_values(request.get_json(silent=True))
+    if errors:
+        return jsonify(errors=errors), 400
+    task = Task(user_id=current_user.id, **values)
+    db.session.add(task)
+    db.session.commit()
+    return jsonify(task.to_dict()), 201
+
+@api.route('/tasks/<int:task_id>', methods=['PATCH'])
+def update_task(task_id):
+    task = get_task_or_abort(task_id)
+    values, errors = task_values(request.get_json(silent=True), task)
+    if errors:
+        return jsonify(errors=errors), 400
+    for name, value in values.items():
+        setattr(task, name, value)
+    db.session.commit()
+    return jsonify(task.to_dict())
+
+@api.route('/tasks/<int:task_id>', methods=['DELETE'])
+def delete_task(task_id):
+    db.session.delete(get_task_or_abort(task_id))
+    db.session.commit()
+    return '', 204
+
+@api.route('/tasks/batch', methods=['POST'])
+def create_tasks():
+    """Create many tasks with one multi-row INSERT; invalid items are reported and skipped."""
+    results, rows = [], []
+    for index, item in enumerate(batch_items('tasks')):
+        values, errors = task_values(item)
+        if errors:
+            results.append({'index': index, 'status': 'invalid', 'errors': errors})
+        else:
+            results.append({'index': index, 'status': 'created'})
+            rows.append(dict(values, user_id=current_user.id))
+
+    if rows:
+        ids = db.session.scalars(db.insert(Task).returning(Task.id, sort_by_parameter_order=True), rows).all()
+        for task_id, row in zip(ids, rows):
+            queue_task_event(db.session, 'created', {'id': task_id}, (row['user_id'], row['assignee_id']))
+        adjust_rollups(db.session, [(None, tuple(row[name] for name in ROLLUP_FIELDS)) for row in rows])
+        db.session.commit()
+        created = iter(ids)
+        for result in results:
+            if result['status'] == 'created':
+                result['id'] = next(created)
+    return jsonify(results=results)
+
+@api.route('/tasks/batch', methods=['PATCH'])
+def update_tasks():
+    """Patch many tasks (each item carries its `id`) with one bulk UPDATE by primary key."""
+    items = batch_items('tasks', id_of=patch_id)
+    ids = {item['id'] for item in items}
+    tasks = {task.id: task for task in db.session.scalars(db.select(Task).where(Task.id.in_(ids)))}
+
+    results, rows = [], []
+    for index, item in enumerate(items):
+        task = tasks.get(item['id'])
+        if task is None:
+            results.append({'index': index, 'status': 'not_found'})
+            continue
+        if not can_modify(task):
+            results.append({'index': index, 'id': task.id, 'status': 'forbidden'})
+            continue
+        values, errors = task_values(item, task)
+        if errors:
+            results.append({'index': index, 'id': task.id, 'status': 'invalid', 'errors': errors})
+        else:
+            results.append({'index': index, 'id': task.id, 'status': 'updated'})
+            if values:
+                rows.append(dict(values, id=task.id))
+                queue_updated(task, values)
+
+    if rows:
+        db.session.execute(db.update(Task), rows)
+        db.session.commit()
+    return jsonify(results=results)
+
+@api.route('/tasks/batch', methods=['DELETE'])
+def delete_tasks():
+    """Delete many tasks by id with a single DELETE."""
+    ids = batch_items('ids', id_of=lambda task_id: task_id)
+    owners = {row.id: row for row in db.session.execute(
+        db.select(Task.id, Task.user_id, Task.assignee_id, Task.start_time, Task.end_time).where(Task.id.in_(ids))
+    )}
+
+    results, allowed = [], []
+    for index, task_id in enumerate(ids):
+        owner = owners.get(task_id)
+        if owner is None:
+            results.append({'index': index, 'id': task_id, 'status': 'not_found'})
+        elif not can_modify(owner):
+            results.append({'index': index, 'id': task_id, 'status': 'forbidden'})
+        else:
+            results.append({'index': index, 'id': task_id, 'status': 'deleted'})
+            allowed.append(task_id)
+
+    if allowed:
+        # Side effects follow the rows actually removed, each once, not the ids asked for
+        deleted = db.session.execute(
+            db.delete(Task).where(Task.id.in_(allowed))
+            .returning(Task.id, Task.user_id, Task.assignee_id, Task.start_time, Task.end_time)
+            .execution_options(synchronize_session=False)
+        ).all()
+        adjust_rollups(db.session, [(rollup_values(row), None) for row in deleted])
+        for row in deleted:
+            queue_task_event(db.session, 'deleted', {'id': row.id}, (row.user_id, row.assignee_id))
+        db.session.commit()
+    return jsonify(results=results)
+
+@api.route('/tasks/batch/<action>', methods=['POST'])
+def stamp_tasks(action):
+    """Start or complete the given task ids with one UPDATE; reports how many changed."""
+    columns = {'start': 'start_time', 'complete': 'end_time'}
+    if action not in columns:
+        abort(404)
+    ids = batch_items('ids', id_of=lambda task_id: task_id)
+    now = datetime.utcnow()
+    changed = Task.stamp_many(columns[action], ids, current_user.id, now)
+    queue_stamped(columns[action], changed, now)
+    db.session.commit()
+    return jsonify(requested=len(ids), changed=len(changed))
@@ -1,52 +1,24 @@
-from flask import Flask, redirect, url_for, request, flash
-from flask_login import LoginManager, current_user
-from flask_migrate import Migrate
-from flask_admin import Admin
-from flask_admin.contrib.sqla import ModelView
+import os
+from flask import Flask
+from flask_login import LoginManager
 from config import Config
-from models import User, Task, db  # Import your models and db instance
-from datetime import datetime
+from models import db  # Import your models and db instance
+from cache import init_cache, identity_cache
+from throttle import init_throttle
+from database import init_engine
+from metrics import init_metrics
+from querylog import init_querylog
+from commands import init_commands
+from assets import init_assets
+from events import init_events
 
 # Initialize extensions
 login_manager = LoginManager()
-migrate = Migrate()
 
 # User loader function for Flask-Login
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))  # Load user by ID
-
-# Custom ModelView for User
-class UserModelView(ModelView):
-    column_list = ('id', 'username', 'email', 'first_name', 'last_name', 'department', 'status', 'date_created')
-    column_searchable_list = ('username', 'email', 'first_name', 'last_name')
-    column_filters = ('status', 'department')
-    column_editable_list = ('status', 'department')
-    form_columns = ('username', 'email', 'password_hash', 'first_name', 'middle_name', 'last_name', 'department',
-                    'phone_number', 'address', 'status', 'profile_picture')
-
-    def is_accessible(self):
-        # Customize access control (e.g., only admin can access)
-        return current_user.is_authenticated and current_user.username == 'admin'
-
-    def inaccessible_callback(self, name, **kwargs):
-        flash("You do not have permission to access this page.", "danger")
-        return redirect(url_for('auth.login', next=request.url))
-
-# Custom ModelView for Task
-class TaskModelView(ModelView):
-    column_list = ('id', 'title', 'description', 'priority', 'due_date', 'task_type', 'user_id', 'assignee_id', 'date_created', 'start_time', 'end_time')
-    column_searchable_list = ('title', 'description')
-    column_filters = ('priority', 'task_type', 'user_id')  # Ensure these attributes exist in the model
-    form_columns = ('title', 'description', 'priority', 'due_date', 'task_type', 'user_id', 'assignee_id', 'start_time', 'end_time')
-
-    def is_accessible(self):
-        # Customize access control (e.g., only admin can access)
-        return current_user.is_authenticated and current_user.username == 'admin'
-
-    def inaccessible_callback(self, name, **kwargs):
-        flash("You do not have permission to access this page.", "danger")
-        return redirect(url_for('auth.login', next=request.url))
+    return identity_cache().get(int(user_id))  # Cached identity, loaded by ID on a miss
 
 def create_app(config_class=Config):
     """Application factory function to create the Flask app."""
@@ -57,8 +29,20 @@ def create_app(config_class=Config):
 
     # Initialize extensions with the app
     db.init_app(app)
+    init_engine(app)
+    init_metrics(app)
+    init_querylog(app)
     login_manager.init_app(app)
-    migrate.init_app(app, db)
+    # Alembic is slow to import and only the `flask db` commands use it, so web
+    # workers and tests skip it; the flask command sets FLASK_RUN_FROM_CLI
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    init_cache(app)
+    init_throttle(app)
+    init_commands(app)
+    init_assets(app)
+    init_events(app)
 
     # Login manager settings
     login_manager.login_view = 'auth.login'  # Default login route
@@ -66,9 +50,11 @@ def create_app(config_class=Config):
     # Register Blueprints
     from auth import auth as auth_blueprint
     from tasks import tasks as tasks_blueprint
+    from api import api as api_blueprint
     
     app.register_blueprint(auth_blueprint)
     app.register_blueprint(tasks_blueprint)
+    app.register_blueprint(api_blueprint)
     app.config['SECRET_KEY'] = 'Hss662hsjuGcsj52u'  # Replace with a secure random key
 
     # Custom Jinja2 filter for formatting datetime
@@ -78,11 +64,9 @@ def create_app(config_class=Config):
             return value.strftime(format)
         return ''
 
-    # Initialize Flask-Admin
-    admin = Admin(app, name='Admin Dashboard', template_mode='bootstrap4')
-    
-    # Add custom model views to the admin
-    admin.add_view(UserModelView(User, db.session))
-    admin.add_view(TaskModelView(Task, db.session))
+    # Flask-Admin, its views and templates are only imported when the admin is enabled
+    if app.config['ADMIN_ENABLED']:
+        from admin import init_admin
+        init_admin(app)
 
     return app
\ No newline at end of file
@@ -0,0 +1,121 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+from flask import current_app, request, send_from_directory
+
+# Text assets worth serving precompressed
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.html'}
+# Profile pictures are already named by their content hash (see uploads.py)
+CONTENT_ADDRESSED = re.compile(r'^[0-9a-f]{64}\.[a-z]+$')
+TEMP_PREFIX = '.compress-'
+
+class StaticAssets:
+    """Manifest mapping static files to content-fingerprinted names, e.g.
+    css/styles.css -> css/styles.1a2b3c4d5e6f.css.
+
+    Fingerprinted URLs change whenever the file does, so they can be served
+    with a far-future immutable Cache-Control.
+    """
+
+    def __init__(self, static_folder, upload_folder):
+        self.static_folder = static_folder
+        self.uploads = os.path.relpath(upload_folder, static_folder).replace(os.sep, '/')
+        self.hashed = {}  # original name -> fingerprinted name
+        self.originals = {}  # fingerprinted name -> original name
+
+    def build(self, compress=True):
+        """Fingerprint every static file outside the uploads folder and write .gz variants."""
+        self.hashed.clear()
+        self.originals.clear()
+        for root, directories, files in os.walk(self.static_folder):
+            relative_root = os.path.relpath(root, self.static_folder).replace(os.sep, '/')
+            if relative_root == self.uploads:
+                directories[:] = []
+                continue
+            for name in files:
+                if name.endswith('.gz') or name.startswith(TEMP_PREFIX):
+                    continue
+                path = os.path.join(root, name)
+                original = name if relative_root == '.' else f'{relative_root}/{name}'
+                stem, extension = os.path.splitext(original)
+                fingerprinted = f'{stem}.{self._digest(path)}{extension}'
+                self.hashed[original] = fingerprinted
+                self.originals[fingerprinted] = original
+                if compress and extension in COMPRESSIBLE_EXTENSIONS:
+                    self._compress(path)
+
+    @staticmethod
+    def _digest(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(64 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()[:12]
+
+    @staticmethod
+    def _compress(path):
+        compressed = path + '.gz'
+        if os.path.exists(compressed) and os.path.getmtime(compressed) >= os.path.getmtime(path):
+            return
+        try:
+            # Written aside and renamed into place, so a worker starting alongside never serves half a file
+            descriptor, temp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=os.path.dirname(path))
+        except OSError:
+            return  # Read-only deployments serve the uncompressed file instead
+        try:
+            with os.fdopen(descriptor, 'wb') as raw, open(path, 'rb') as source, \
+                    gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=9) as target:
+                target.write(source.read())
+            os.chmod(temp_path, 0o644)  # mkstemp's 0600 would hide it from a separate static server
+            os.replace(temp_path, compressed)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def is_immutable(self, filename):
+        """True if the name alone guarantees the content (fingerprinted or content-addressed)."""
+        if filename in self.originals:
+            return True
+        folder, _, name = filename.rpartition('/')
+        return folder == self.uploads and bool(CONTENT_ADDRESSED.match(name))
+
+def static_assets():
+    return current_app.extensions['static_assets']
+
+def fingerprint_static_urls(endpoint, values):
+    # url_for('static', filename=...) yields the fingerprinted name when there is one
+    if endpoint == 'static' and 'filename' in values and not current_app.debug:
+        values['filename'] = static_assets().hashed.get(values['filename'], values['filename'])
+
+def send_static(filename):
+    """Serve static files, with immutable caching and gzip variants for fingerprinted names."""
+    assets = static_assets()
+    if not assets.is_immutable(filename):
+        return current_app.send_static_file(filename)
+
+    original = assets.originals.get(filename, filename)
+    compressed = os.path.join(assets.static_folder, original + '.gz')
+    if 'gzip' in request.accept_encodings and os.path.exists(compressed):
+        response = send_from_directory(assets.static_folder, original + '.gz',
+                                       mimetype=mimetypes.guess_type(original)[0])
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = send_from_directory(assets.static_folder, original)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['STATIC_IMMUTABLE_MAX_AGE']
+    response.cache_control.immutable = True
+    return response
+
+def init_assets(app):
+    """Build the static manifest at startup and route static URLs through it."""
+    assets = StaticAssets(app.static_folder, app.config['UPLOAD_FOLDER'])
+    app.extensions['static_assets'] = assets
+    if not app.config['STATIC_FINGERPRINT']:
+        return
+    assets.build(compress=app.config['STATIC_PRECOMPRESS'])
+    app.url_defaults(fingerprint_static_urls)
+    app.view_functions['static'] = send_static
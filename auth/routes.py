@@ -1,20 +1,12 @@
-from flask import render_template, redirect, url_for, flash, request, abort
+from flask import render_template, redirect, url_for, flash, request, abort, jsonify, current_app
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.utils import secure_filename
-import os
 from .forms import RegistrationForm, LoginForm, ProfileForm
 from . import auth
 from models import User, db  # Correct import assuming you're using relative imports
-
-UPLOAD_FOLDER = 'static/uploads'
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-
-# Ensure the upload folder exists
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+from cache import user_directory
+from passwords import needs_rehash
+from throttle import login_throttle
+from uploads import allowed_file, store_upload, UploadTooLarge
 
 @auth.route('/register', methods=['GET', 'POST'])
 def register():
@@ -49,12 +41,23 @@ def login():
         
     form = LoginForm()
     if form.validate_on_submit():
+        # Turn away throttled attempts before looking up the user or hashing anything
+        throttle = login_throttle()
+        if throttle and not throttle.allow(request.remote_addr, form.login_identifier.data):
+            flash('Too many login attempts. Please wait a minute and try again.', 'danger')
+            return render_template('login.html', form=form), 429
+
         user = User.query.filter(
             (User.email == form.login_identifier.data) |
             (User.username == form.login_identifier.data)
         ).first()
         
         if user and user.check_password(form.password.data):
+            # Re-hash with the current method and cost while we have the plain password
+            if needs_rehash(user.password_hash):
+                user.set_password(form.password.data)
+                db.session.commit()
+
             login_user(user)
             flash('Login successful!', 'success')
             
@@ -71,29 +74,47 @@ def login():
 @auth.route('/profile', methods=['GET', 'POST'])
 @login_required
 def edit_profile():
-    form = ProfileForm(obj=current_user)
+    # current_user is a cached identity, so edit the full row
+    user = db.get_or_404(User, current_user.id)
+    form = ProfileForm(obj=user)
 
     if form.validate_on_submit():
-        current_user.first_name = form.first_name.data
-        current_user.middle_name = form.middle_name.data
-        current_user.last_name = form.last_name.data
-        current_user.department = form.department.data
-        current_user.phone_number = form.phone_number.data
-        current_user.address = form.address.data
+        user.first_name = form.first_name.data
+        user.middle_name = form.middle_name.data
+        user.last_name = form.last_name.data
+        user.department = form.department.data
+        user.phone_number = form.phone_number.data
+        user.address = form.address.data
 
         # Handle profile picture upload
         if 'profile_picture' in request.files:
             file = request.files['profile_picture']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file.save(os.path.join(UPLOAD_FOLDER, filename))
-                current_user.profile_picture = filename
+                # Stored under its content hash, so duplicates share one file
+                try:
+                    user.profile_picture = store_upload(
+                        file, current_app.config['UPLOAD_FOLDER'], current_app.config['MAX_AVATAR_BYTES']
+                    )
+                except UploadTooLarge as error:
+                    db.session.rollback()
+                    flash(str(error), 'danger')
+                    return render_template('profile.html', form=form, user=user)
 
         db.session.commit()
         flash('Your profile has been updated.', 'success')
         return redirect(url_for('tasks.dashboard'))
 
-    return render_template('profile.html', form=form, user=current_user)
+    return render_template('profile.html', form=form, user=user)
+
+@auth.route('/users/search')
+@login_required
+def search_users():
+    """Return users whose username starts with the `q` prefix, for assignee typeahead."""
+    prefix = request.args.get('q', '').strip()
+    if not prefix:
+        return jsonify([])
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify([entry._asdict() for entry in user_directory().search(prefix, limit)])
 
 @auth.route('/settings')
 @login_required
@@ -112,12 +133,13 @@ def update_notifications():
 def update_security():
     current_password = request.form.get('current_password')
     new_password = request.form.get('new_password')
+    user = db.get_or_404(User, current_user.id)
 
-    if not current_user.check_password(current_password):
+    if not user.check_password(current_password):
         flash('Current password is incorrect.', 'danger')
         return redirect(url_for('auth.settings'))
 
-    current_user.set_password(new_password)
+    user.set_password(new_password)
     db.session.commit()
     flash('Password updated successfully!', 'success')
     return redirect(url_for('auth.settings'))
@@ -126,7 +148,8 @@ def update_security():
 @login_required
 def update_privacy():
     profile_visibility = request.form.get('profile_visibility')
-    current_user.profile_visibility = profile_visibility  # Ensure this field exists in your User model
+    user = db.get_or_404(User, current_user.id)
+    user.profile_visibility = profile_visibility  # Ensure this field exists in your User model
     db.session.commit()
     flash('Privacy settings updated!', 'success')
     return redirect(url_for('auth.settings'))
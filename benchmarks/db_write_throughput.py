@@ -0,0 +1,110 @@
+"""Compare concurrent write throughput of the SQLite engine profiles.
+
+Writer threads mimic start_task/end_task and task creation while reader
+threads load dashboard pages, all against one SQLite file per profile.
+
+    python -m benchmarks.db_write_throughput --writers 8 --readers 8 --seconds 5
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from sqlalchemy.exc import OperationalError
+from app import create_app
+from config import Config, SQLiteWALConfig
+from models import Task, User, db
+
+PROFILES = {'sqlite': Config, 'sqlite-wal': SQLiteWALConfig}
+
+def make_app(profile, path):
+    config_class = type('BenchmarkConfig', (PROFILES[profile],), {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'PASSWORD_HASH_WORKERS': 0,
+    })
+    return create_app(config_class)
+
+def seed(app, users, tasks_per_user):
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(User), [
+            {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x'} for i in range(users)
+        ])
+        db.session.execute(db.insert(Task), [
+            {'title': f'Task {i}', 'user_id': i % users + 1, 'date_created': datetime.utcnow()}
+            for i in range(users * tasks_per_user)
+        ])
+        db.session.commit()
+
+def run(app, writers, readers, seconds, users):
+    counts = {'writes': 0, 'reads': 0, 'locked': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def record(key):
+        with lock:
+            counts[key] += 1
+
+    def writer(worker):
+        user_id = worker % users + 1
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                try:
+                    task = Task(title='Created', user_id=user_id)
+                    db.session.add(task)
+                    db.session.commit()
+                    task.start_time = datetime.utcnow()
+                    db.session.commit()
+                    task.end_time = datetime.utcnow()
+                    db.session.commit()
+                    record('writes')
+                except OperationalError as error:
+                    db.session.rollback()
+                    record('locked' if 'locked' in str(error) else 'errors')
+
+    def reader(worker):
+        user_id = worker % users + 1
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                try:
+                    Task.page_visible_to(user_id, 20)
+                    db.session.rollback()  # End the read transaction like a request would
+                    record('reads')
+                except OperationalError:
+                    db.session.rollback()
+                    record('errors')
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {key: value / elapsed if key in ('writes', 'reads') else value for key, value in counts.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument('--writers', type=int, default=8, help='threads creating, starting and ending tasks')
+    parser.add_argument('--readers', type=int, default=8, help='threads loading dashboard pages')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--tasks-per-user', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f'{args.writers} writers, {args.readers} readers, {args.seconds:.0f}s per profile')
+    for profile in args.profiles:
+        with tempfile.TemporaryDirectory() as directory:
+            app = make_app(profile, os.path.join(directory, 'bench.db'))
+            seed(app, args.users, args.tasks_per_user)
+            result = run(app, args.writers, args.readers, args.seconds, args.users)
+            with app.app_context():
+                db.engine.dispose()
+        print(f"{profile:<12} {result['writes']:8.1f} task lifecycles/sec  {result['reads']:8.1f} pages/sec  "
+              f"{result['locked']:5d} 'database is locked'  {result['errors']:5d} other errors")
+
+if __name__ == '__main__':
+    main()
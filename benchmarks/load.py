@@ -0,0 +1,227 @@
+"""Drive concurrent scripted user sessions against the app and report per-route results.
+
+Each session registers its own user, logs in, then repeatedly views the
+dashboard, creates a task and starts and ends it until time runs out.
+Sessions run in threads sharing one app (like a threaded server) or in
+separate processes (like WSGI workers), against an in-process app on a
+scratch database or a server that is already listening.
+
+    python -m benchmarks.load --profile sqlite-wal --concurrency 16 --seconds 10
+    python -m benchmarks.load --mode processes --concurrency 4 --profile sqlite
+    python -m benchmarks.load --url http://127.0.0.1:5000 --concurrency 8
+"""
+import argparse
+import os
+import re
+import tempfile
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+from app import create_app
+from benchmarks.routes import percentile
+from config import DATABASE_PROFILES
+from models import db
+from passwords import shutdown_pool
+
+CSRF_TOKEN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+NEWEST_TASK = re.compile(r'data-task-id="(\d+)"')
+PASSWORD = 'load-test-password'
+
+class InProcessClient:
+    """Sends requests to a Flask app through its test client."""
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self._client.open(path, method=method, data=data)
+        return response.status_code, response.get_data(as_text=True)
+
+class _NoRedirects(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class HttpClient:
+    """Sends requests to a running server, keeping its session cookie like a browser."""
+
+    def __init__(self, base_url):
+        self._base_url = base_url.rstrip('/')
+        self._opener = build_opener(HTTPCookieProcessor(CookieJar()), _NoRedirects())
+
+    def request(self, method, path, data=None):
+        body = urlencode(data).encode() if data is not None else None
+        try:
+            with self._opener.open(Request(self._base_url + path, data=body, method=method), timeout=60) as response:
+                return response.status, response.read().decode('utf-8', 'replace')
+        except HTTPError as error:  # Also raised for the redirects we do not follow
+            return error.code, error.read().decode('utf-8', 'replace')
+
+def error_label(status, body):
+    """A short name for a failed response, used to group errors per route."""
+    if 'database is locked' in body:
+        return 'database is locked'
+    return f'HTTP {status}'
+
+def run_session(client, deadline):
+    """Run one scripted user session until `deadline` and return its (route, seconds, error) samples."""
+    samples = []
+    state = {'csrf': None}
+
+    def call(route, method, path, data=None, expect=(200, 302)):
+        if data is not None and state['csrf']:
+            data = dict(data, csrf_token=state['csrf'])
+        start = time.perf_counter()
+        try:
+            status, body = client.request(method, path, data)
+        except (URLError, OSError) as error:
+            samples.append((route, time.perf_counter() - start, type(error).__name__))
+            return None
+        except Exception as error:
+            # In process, the app's exceptions reach us instead of becoming a 500
+            samples.append((route, time.perf_counter() - start, error_label(500, str(error))))
+            return None
+        error = None if status in expect else error_label(status, body)
+        samples.append((route, time.perf_counter() - start, error))
+        if error:
+            return None
+        token = CSRF_TOKEN.search(body)
+        if token:
+            state['csrf'] = token.group(1)
+        return body
+
+    username = f'load-{uuid.uuid4().hex[:12]}'
+    if call('register GET', 'GET', '/register') is None:
+        return samples
+    if call('register', 'POST', '/register', {'username': username, 'email': f'{username}@example.com',
+                                               'password': PASSWORD, 'confirm_password': PASSWORD}) is None:
+        return samples
+    if call('login GET', 'GET', '/login') is None:
+        return samples
+    if call('login', 'POST', '/login', {'login_identifier': username, 'password': PASSWORD}) is None:
+        return samples
+
+    cycle = 0
+    while cycle == 0 or time.perf_counter() < deadline:  # At least one cycle, so every route is measured
+        cycle += 1
+        if call('dashboard GET', 'GET', '/dashboard') is None:
+            continue
+        if call('dashboard POST', 'POST', '/dashboard', {'task_title': f'Load task {cycle}', 'task_type': 'individual',
+                                                         'priority': 'medium'}) is None:
+            continue
+        # The user's newest task leads their dashboard
+        page = call('dashboard GET', 'GET', '/dashboard')
+        newest = NEWEST_TASK.search(page or '')
+        if newest is None:
+            continue
+        call('start_task', 'POST', f'/task/start/{newest.group(1)}')
+        call('end_task', 'POST', f'/end_task/{newest.group(1)}')
+    return samples
+
+def make_app(profile, database_url):
+    config_class = type('LoadConfig', (DATABASE_PROFILES[profile],), {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'PROPAGATE_EXCEPTIONS': True,  # Let database errors reach the driver to be classified
+        'LOGIN_THROTTLE_ENABLED': False,  # Every session logs in from the same address
+    })
+    return create_app(config_class)
+
+def prepare_database(profile, database_url):
+    app = make_app(profile, database_url)
+    with app.app_context():
+        db.create_all()
+        db.engine.dispose()
+
+def _client_factory(target):
+    kind, value = target
+    if kind == 'url':
+        return lambda: HttpClient(value)
+    app = make_app(*value)
+    return lambda: InProcessClient(app)
+
+def run_sessions(target, sessions, deadline):
+    """Run `sessions` concurrent sessions in threads of this process and return all their samples."""
+    new_client = _client_factory(target)
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        results = pool.map(lambda _: run_session(new_client(), deadline), range(sessions))
+        return [sample for samples in results for sample in samples]
+
+def run(target, concurrency, seconds, mode='threads'):
+    """Run `concurrency` sessions for `seconds` and return (elapsed seconds, samples).
+
+    `target` is ('url', base_url) or ('app', (profile, database_url)). In
+    'processes' mode every session gets its own process and, in process, its
+    own app and connection pool.
+    """
+    start = time.perf_counter()
+    if mode == 'processes':
+        # perf_counter is per process, so each worker sets its own deadline
+        with ProcessPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(_process_sessions, target, seconds) for _ in range(concurrency)]
+            samples = [sample for future in futures for sample in future.result()]
+    else:
+        samples = run_sessions(target, concurrency, start + seconds)
+    return time.perf_counter() - start, samples
+
+def _process_sessions(target, seconds):
+    try:
+        return run_sessions(target, 1, time.perf_counter() + seconds)
+    finally:
+        shutdown_pool()  # Otherwise the worker waits on its hashing processes when it exits
+
+def summarize(elapsed, samples):
+    """Per-route requests/sec, latency percentiles in ms and error counts."""
+    by_route = defaultdict(list)
+    for route, seconds, error in samples:
+        by_route[route].append((seconds, error))
+    summary = {}
+    for route, timings in by_route.items():
+        latencies = sorted(seconds for seconds, _ in timings)
+        summary[route] = {
+            'requests': len(timings),
+            'per_second': len(timings) / elapsed,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'errors': Counter(error for _, error in timings if error),
+        }
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='base URL of a running server; in process when omitted')
+    parser.add_argument('--profile', default='sqlite-wal', choices=list(DATABASE_PROFILES),
+                        help='engine profile for the in-process app')
+    parser.add_argument('--database-url', help='database for the in-process app; a scratch SQLite file by default')
+    parser.add_argument('--mode', default='threads', choices=['threads', 'processes'])
+    parser.add_argument('--concurrency', type=int, default=8, help='simultaneous user sessions')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.url:
+            target = ('url', args.url)
+        else:
+            database_url = args.database_url or f"sqlite:///{os.path.join(directory, 'load.db')}"
+            prepare_database(args.profile, database_url)
+            target = ('app', (args.profile, database_url))
+        elapsed, samples = run(target, args.concurrency, args.seconds, args.mode)
+
+    where = args.url or f'in process ({args.profile})'
+    print(f'{args.concurrency} sessions in {args.mode} against {where}, {elapsed:.1f}s')
+    print(f"{'route':<16} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    summary = summarize(elapsed, samples)
+    for route, result in summary.items():
+        print(f"{route:<16} {result['per_second']:8.1f} {result['p50_ms']:8.1f} {result['p95_ms']:8.1f} "
+              f"{result['p99_ms']:8.1f} {sum(result['errors'].values()):7d}")
+        for error, count in result['errors'].most_common():
+            print(f'    {count:6d} x {error}')
+    completed = sum(1 for route, _, error in samples if route == 'end_task' and not error)
+    print(f'{len(samples) / elapsed:.1f} requests/sec, {completed / elapsed:.1f} completed tasks/sec')
+
+if __name__ == '__main__':
+    main()
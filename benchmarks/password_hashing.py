@@ -0,0 +1,54 @@
+"""Report password verifications (logins) per second for each hashing cost.
+
+    python -m benchmarks.password_hashing --threads 8 --workers 4
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash
+from app import create_app
+from config import TestingConfig
+from passwords import verify_password
+
+DEFAULT_METHODS = [
+    'pbkdf2:sha256:100000',
+    'pbkdf2:sha256:600000',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+]
+
+def logins_per_second(app, method, threads, seconds):
+    """Verify one password from `threads` request threads for about `seconds`."""
+    password_hash = generate_password_hash('correct horse', method)
+    deadline = time.perf_counter() + seconds
+
+    def login_loop():
+        count = 0
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                assert verify_password(password_hash, 'correct horse')
+                count += 1
+        return count
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        total = sum(pool.map(lambda _: login_loop(), range(threads)))
+    return total / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS, help='Werkzeug method strings to compare')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent request threads')
+    parser.add_argument('--workers', type=int, default=2, help='PASSWORD_HASH_WORKERS (0 hashes inline)')
+    parser.add_argument('--seconds', type=float, default=3.0, help='duration of each run')
+    args = parser.parse_args()
+
+    app = create_app(TestingConfig)
+    app.config['PASSWORD_HASH_WORKERS'] = args.workers
+    print(f'{args.threads} threads, {args.workers} hashing workers')
+    for method in args.methods:
+        rate = logins_per_second(app, method, args.threads, args.seconds)
+        print(f'{method:<24} {rate:10.1f} logins/sec')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""Time the hot routes against a seeded dataset and compare with a stored baseline.
+
+Each route is requested repeatedly through the test client; latency
+percentiles and the SQL statements per request are reported, and any route
+that runs more queries than the baseline, or whose median is slower by
+more than the tolerance, is reported as a regression (exit status 1).
+
+    python -m benchmarks.routes --users 1000 --tasks 100000 --requests 50
+    python -m benchmarks.routes --save-baseline    # after an intended change
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from app import create_app
+from config import TestingConfig
+from models import Task, TaskState, User, db
+from rollups import rebuild_rollups
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'routes_baseline.json')
+PASSWORD = 'benchmark'
+PERCENTILES = (50, 95, 99)
+
+def make_app():
+    # Every benchmark login is for the same user, so the throttle would soon refuse them. Query
+    # fingerprinting is left off so timings match production; the query counts catch N+1 anyway.
+    config_class = type('BenchmarkConfig', (TestingConfig,), {'LOGIN_THROTTLE_ENABLED': False, 'QUERY_DEBUG': False})
+    return create_app(config_class)
+
+def seed(users, tasks, fresh, batch_size=10000):
+    """Bulk insert `users` users and `tasks` tasks spread over them, plus `fresh` open tasks for user 1.
+
+    User 1 ('bench') and user 2 ('admin') are the ones the benchmark logs in
+    as. A third of the tasks are done and a third in progress. Returns the
+    ids of the fresh tasks, which the start/end routes work through.
+    """
+    password_hash = generate_password_hash(PASSWORD, TestingConfig.PASSWORD_HASH_METHOD)
+    departments = ('HR', 'IT', 'Finance', 'Marketing', 'Operations', 'Legal')
+    names = ['bench', 'admin'] + [f'user{i}' for i in range(2, users)]
+    db.session.execute(db.insert(User), [
+        {'username': name, 'email': f'{name}@example.com', 'password_hash': password_hash,
+         'first_name': name, 'last_name': 'Benchmark', 'phone_number': '555-0100',
+         'department': departments[i % len(departments)]}
+        for i, name in enumerate(names)
+    ])
+
+    now = datetime.utcnow()
+    for first in range(0, tasks, batch_size):
+        rows = []
+        for i in range(first, min(first + batch_size, tasks)):
+            created = now - timedelta(minutes=i)
+            start_time = created + timedelta(minutes=5) if i % 3 else None
+            end_time = start_time + timedelta(minutes=i % 240) if i % 3 == 2 else None
+            rows.append({
+                'title': f'Task {i}', 'description': f'Seeded task number {i}',
+                'priority': ('low', 'medium', 'high')[i % 3], 'user_id': i % users + 1,
+                'assignee_id': (i * 7) % users + 1 if i % 4 == 0 else None,
+                'date_created': created, 'updated_at': created, 'start_time': start_time, 'end_time': end_time,
+                'status': TaskState.for_times(start_time, end_time).value,
+            })
+        db.session.execute(db.insert(Task), rows)
+
+    fresh_ids = db.session.scalars(db.insert(Task).returning(Task.id), [
+        {'title': f'Fresh {i}', 'user_id': 1, 'date_created': now, 'updated_at': now,
+         'status': TaskState.OPEN.value}
+        for i in range(fresh)
+    ]).all()
+    db.session.commit()
+    rebuild_rollups()
+    return fresh_ids
+
+def scenarios(fresh_ids):
+    """(route name, login, method, url, form data) for every request the benchmark makes."""
+    edited = fresh_ids[0]
+    for i, task_id in enumerate(fresh_ids):
+        yield 'login', None, 'POST', '/login', {'login_identifier': 'bench', 'password': PASSWORD}
+        yield 'dashboard GET', 'bench', 'GET', '/dashboard', None
+        yield 'dashboard POST', 'bench', 'POST', '/dashboard', {
+            'task_title': f'Created {i}', 'task_description': 'From the benchmark',
+            'task_type': 'individual', 'priority': 'medium',
+        }
+        yield 'edit_task GET', 'bench', 'GET', f'/task/edit/{edited}', None
+        yield 'edit_task POST', 'bench', 'POST', f'/task/edit/{edited}', {
+            'task_title': f'Edited {i}', 'task_type': 'individual', 'priority': 'high',
+        }
+        yield 'start_task', 'bench', 'POST', f'/task/start/{task_id}', None
+        yield 'end_task', 'bench', 'POST', f'/end_task/{task_id}', None
+        yield 'admin tasks', 'admin', 'GET', '/admin/task/', None
+        yield 'admin users', 'admin', 'GET', '/admin/user/', None
+
+def run(app, fresh_ids):
+    """Request every scenario and return {route: {'p50_ms', 'p95_ms', 'p99_ms', 'queries', 'requests'}}.
+
+    Call it outside any app context: a request inside one shares its `g` and
+    database session, which hides the logged-in user's lookups and queries.
+    """
+    with app.app_context():
+        engine = db.engine
+    clients = {}
+    for username in ('bench', 'admin'):
+        clients[username] = app.test_client()
+        response = clients[username].post('/login', data={'login_identifier': username, 'password': PASSWORD})
+        assert response.status_code == 302, f'could not log in as {username}'
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    samples = {}
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        for name, login, method, url, data in scenarios(fresh_ids):
+            # Logins use a fresh client, since a logged-in one is sent straight on
+            client = clients[login] if login else app.test_client()
+            before = len(statements)
+            start = time.perf_counter()
+            response = client.open(url, method=method, data=data)
+            elapsed = time.perf_counter() - start
+            assert response.status_code < 400, f'{name}: {method} {url} answered {response.status_code}'
+            samples.setdefault(name, []).append((elapsed, len(statements) - before))
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+    results = {}
+    for name, timings in samples.items():
+        latencies = sorted(elapsed for elapsed, _ in timings)
+        results[name] = {f'p{p}_ms': round(percentile(latencies, p) * 1000, 3) for p in PERCENTILES}
+        results[name]['queries'] = max(queries for _, queries in timings)
+        results[name]['requests'] = len(timings)
+    return results
+
+def percentile(ordered, p):
+    """The nearest-rank p-th percentile of an already sorted list."""
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def compare(results, baseline, tolerance, same_dataset=True):
+    """List the regressions of `results` against a baseline's routes.
+
+    More queries than the baseline is always a regression. Latency is
+    judged on the median, which is steady enough between runs to gate on,
+    and only counts when it is over the baseline by more than `tolerance`
+    (a fraction) and the runs used the same dataset.
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result['queries'] > expected['queries']:
+            regressions.append(f"{name}: {result['queries']} queries per request, baseline {expected['queries']}")
+        if same_dataset and result['p50_ms'] > expected['p50_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {result['p50_ms']:.1f} ms, baseline {expected['p50_ms']:.1f} ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=50, help='requests per route')
+    parser.add_argument('--baseline', default=BASELINE, help='JSON file of stored results')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed median slowdown, as a fraction')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the new baseline')
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        fresh_ids = seed(args.users, args.tasks, args.requests)
+        print(f'Seeded {args.users} users and {args.tasks} tasks in {time.perf_counter() - start:.1f}s')
+    results = run(app, fresh_ids)
+
+    print(f"{'route':<16} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+    for name, result in results.items():
+        print(f"{name:<16} {result['p50_ms']:8.2f} {result['p95_ms']:8.2f} {result['p99_ms']:8.2f} "
+              f"{result['queries']:8d}")
+
+    dataset = {'users': args.users, 'tasks': args.tasks}
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as stored:
+            json.dump({'dataset': dataset, 'routes': results}, stored, indent=2)
+            stored.write('\n')
+        print(f'Saved the baseline to {args.baseline}')
+        return
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}; run with --save-baseline to store one')
+        return
+
+    with open(args.baseline, encoding='utf-8') as stored:
+        baseline = json.load(stored)
+    same_dataset = baseline['dataset'] == dataset
+    if not same_dataset:
+        print(f"Baseline dataset was {baseline['dataset']}; comparing query counts only")
+    regressions = compare(results, baseline['routes'], args.tolerance, same_dataset)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if regressions:
+        sys.exit(1)
+    print('No regressions against the baseline')
+
+if __name__ == '__main__':
+    main()
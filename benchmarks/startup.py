@@ -0,0 +1,81 @@
+"""Measure import time and cold start in fresh interpreters and fail when over budget.
+
+Every case runs in a new Python process, several times, and its median is
+compared with the budget. Each case also lists modules it must not load,
+such as Flask-Admin for a model import.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --budget-scale 2    # on a slower machine
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (code timed in a fresh interpreter, budget in seconds, modules it must not import)
+CASES = {
+    'import models': ('import models', 0.8, ('flask_admin', 'flask_wtf', 'alembic')),
+    'create_app': (
+        'from app import create_app\n'
+        'from config import TestingConfig\n'
+        'create_app(TestingConfig)',
+        1.2, ('alembic',)),
+    'create_app without admin': (
+        'from app import create_app\n'
+        'from config import TestingConfig\n'
+        "create_app(type('NoAdmin', (TestingConfig,), {'ADMIN_ENABLED': False}))",
+        1.1, ('flask_admin', 'alembic')),
+    'first request': (
+        'from app import create_app\n'
+        'from config import TestingConfig\n'
+        "assert create_app(TestingConfig).test_client().get('/login').status_code == 200",
+        1.3, ('alembic',)),
+}
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+exec(compile(sys.argv[1], '<case>', 'exec'))
+elapsed = time.perf_counter() - started
+print(json.dumps({'seconds': elapsed, 'loaded': [name for name in sys.argv[2:] if name in sys.modules]}))
+'''
+
+def run_case(code, forbidden=()):
+    """Run `code` in a fresh interpreter; return its seconds and which `forbidden` modules it loaded."""
+    env = {key: value for key, value in os.environ.items() if key != 'FLASK_RUN_FROM_CLI'}
+    output = subprocess.run([sys.executable, '-c', PROBE, code, *forbidden], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return result['seconds'], result['loaded']
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per case')
+    parser.add_argument('--budget-scale', type=float, default=1.0, help='multiply every budget by this')
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'case':<26} {'median s':>9} {'budget s':>9}")
+    for name, (code, budget, forbidden) in CASES.items():
+        timings, loaded = [], set()
+        for _ in range(args.runs):
+            seconds, modules = run_case(code, forbidden)
+            timings.append(seconds)
+            loaded.update(modules)
+        median, budget = statistics.median(timings), budget * args.budget_scale
+        print(f'{name:<26} {median:9.3f} {budget:9.3f}')
+        if median > budget:
+            failures.append(f'{name}: {median:.3f}s is over the {budget:.3f}s budget')
+        if loaded:
+            failures.append(f"{name}: imported {', '.join(sorted(loaded))}")
+    for failure in failures:
+        print(f'OVER BUDGET {failure}')
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
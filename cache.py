@@ -0,0 +1,146 @@
+import bisect
+import threading
+import time
+from collections import namedtuple, OrderedDict
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import User, db
+
+# Slim row used wherever we only need to name or pick a user
+DirectoryEntry = namedtuple('DirectoryEntry', ['id', 'username', 'department'])
+
+class UserDirectory:
+    """Cached, username-sorted list of (id, username, department) for every user.
+
+    The directory is rebuilt from three columns on first use after it has been
+    invalidated or its TTL has expired, so other workers pick up changes within
+    USER_DIRECTORY_TTL seconds even though invalidation is in-process.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot = None  # (loaded_at, entries, keys, by_id)
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def _current(self):
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - snapshot[0] > self.ttl:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or time.monotonic() - snapshot[0] > self.ttl:
+                    snapshot = self._snapshot = self._load()
+        return snapshot
+
+    def _load(self):
+        rows = db.session.execute(db.select(User.id, User.username, User.department)).all()
+        entries = sorted((DirectoryEntry(*row) for row in rows), key=lambda entry: entry.username.lower())
+        keys = [entry.username.lower() for entry in entries]
+        by_id = {entry.id: entry for entry in entries}
+        return time.monotonic(), entries, keys, by_id
+
+    def get(self, user_id):
+        """Return the entry for a user id, or None if there is no such user."""
+        return self._current()[3].get(user_id)
+
+    def search(self, prefix, limit=10):
+        """Return up to `limit` entries whose username starts with `prefix` (case-insensitive)."""
+        _, entries, keys, _ = self._current()
+        prefix = prefix.lower()
+        start = bisect.bisect_left(keys, prefix)
+        matches = []
+        for entry, key in zip(entries[start:start + limit], keys[start:start + limit]):
+            if not key.startswith(prefix):
+                break
+            matches.append(entry)
+        return matches
+
+# Columns of User that authorization checks and templates read from current_user
+IDENTITY_COLUMNS = ('id', 'username', 'is_admin', 'status', 'department', 'profile_picture', 'updated_at')
+
+class Identity(UserMixin, namedtuple('IdentityRow', IDENTITY_COLUMNS)):
+    """Immutable stand-in for User that Flask-Login keeps as current_user.
+
+    Routes that change the user load the full User row themselves.
+    """
+    __slots__ = ()
+
+class IdentityCache:
+    """Bounded LRU of Identity objects keyed by user id, each kept for `ttl` seconds."""
+
+    def __init__(self, ttl, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (expires_at, identity)
+
+    def get(self, user_id):
+        """Return the Identity for a user id, loading it on a miss (None if no such user)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+
+        columns = [getattr(User, name) for name in IDENTITY_COLUMNS]
+        row = db.session.execute(db.select(*columns).where(User.id == user_id)).first()
+        if row is None:
+            return None
+        identity = Identity(*row)
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, identity)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return identity
+
+    def invalidate(self, user_id=None):
+        """Drop one user's identity, or every identity when no id is given."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+def identity_cache():
+    """Return the identity cache for the current app."""
+    return current_app.extensions['identity_cache']
+
+def user_directory():
+    """Return the user directory for the current app."""
+    return current_app.extensions['user_directory']
+
+def directory_entry(user_id):
+    """Template helper returning the directory entry for a user id (or None)."""
+    return user_directory().get(user_id) if user_id else None
+
+def init_cache(app):
+    """Attach the per-app caches to the application."""
+    app.extensions['user_directory'] = UserDirectory(app.config['USER_DIRECTORY_TTL'])
+    app.extensions['identity_cache'] = IdentityCache(app.config['IDENTITY_CACHE_TTL'])
+    app.add_template_global(directory_entry)
+
+# Invalidate once the transaction that touched a user commits, whichever code
+# path made the change (registration, profile, security settings or Flask-Admin).
+@event.listens_for(Session, 'after_flush')
+def _track_user_changes(session, flush_context):
+    changed = {obj.id for obj in (*session.new, *session.dirty, *session.deleted) if isinstance(obj, User)}
+    if changed:
+        session.info.setdefault('changed_user_ids', set()).update(changed)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_user_caches(session):
+    changed = session.info.pop('changed_user_ids', None)
+    if changed and 'user_directory' in current_app.extensions:
+        user_directory().invalidate()
+        for user_id in changed:
+            identity_cache().invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_user_changes(session):
+    session.info.pop('changed_user_ids', None)
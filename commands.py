@@ -0,0 +1,94 @@
+import os
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from models import User, db
+from uploads import prune_uploads
+from assets import static_assets
+from rollups import rebuild_rollups
+from imports import read_records, run_import, read_checkpoint, write_checkpoint
+
+uploads_cli = AppGroup('uploads', help='Maintain uploaded files.')
+assets_cli = AppGroup('assets', help='Build static assets.')
+rollups_cli = AppGroup('rollups', help='Maintain the time-tracking rollups.')
+import_cli = AppGroup('import', help='Load users and tasks from CSV or NDJSON files.')
+
+@uploads_cli.command('prune')
+@click.option('--grace', type=int, default=None, help='Keep files younger than this many seconds.')
+def prune_uploads_command(grace):
+    """Delete profile pictures that no user references any more."""
+    referenced = set(db.session.scalars(
+        db.select(User.profile_picture).where(User.profile_picture.isnot(None)).distinct()
+    ))
+    if grace is None:
+        grace = current_app.config['UPLOAD_PRUNE_GRACE_SECONDS']
+    removed = prune_uploads(current_app.config['UPLOAD_FOLDER'], referenced, grace)
+    click.echo(f'Removed {removed} orphaned upload(s).')
+
+@assets_cli.command('build')
+def build_assets_command():
+    """Fingerprint static files and write their precompressed .gz variants."""
+    assets = static_assets()
+    assets.build(compress=True)
+    for original, fingerprinted in sorted(assets.hashed.items()):
+        click.echo(f'{original} -> {fingerprinted}')
+
+@rollups_cli.command('backfill')
+@click.option('--batch-size', type=int, default=1000, help='Tasks fetched per round trip.')
+def backfill_rollups_command(batch_size):
+    """Rebuild the per-user, per-day rollups from every completed task."""
+    written = rebuild_rollups(batch_size)
+    click.echo(f'Wrote {written} rollup row(s).')
+
+def import_options(command):
+    command = click.argument('path', type=click.Path(exists=True, dir_okay=False))(command)
+    command = click.option('--format', type=click.Choice(['csv', 'ndjson']), default=None,
+                           help='File format; taken from the extension by default.')(command)
+    command = click.option('--chunk-size', type=click.IntRange(min=1), default=500,
+                           help='Records inserted per statement and commit.')(command)
+    command = click.option('--checkpoint', default=None,
+                           help='Progress file for resuming; PATH.checkpoint by default.')(command)
+    return click.option('--restart', is_flag=True, help='Ignore an existing checkpoint.')(command)
+
+def import_file(kind, path, format, chunk_size, checkpoint, restart):
+    checkpoint = checkpoint or path + '.checkpoint'
+    try:
+        start = 0 if restart else read_checkpoint(checkpoint, path)
+    except ValueError as error:
+        raise click.ClickException(f'{error}; pass --restart to import from the beginning.')
+    if start:
+        click.echo(f'Resuming after record {start}.')
+
+    began = time.monotonic()
+
+    def report(done, skipped):
+        write_checkpoint(checkpoint, path, done)
+        for number, reason in skipped:
+            click.echo(f'Record {number} skipped: {reason}', err=True)
+        rate = (done - start) / max(time.monotonic() - began, 1e-6)
+        click.echo(f'{done} record(s) read ({rate:.0f} rows/sec)')
+
+    skipped = run_import(kind, read_records(path, format), chunk_size, start, report)
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    click.echo(f'Import finished: {len(skipped)} record(s) skipped.')
+
+@import_cli.command('users')
+@import_options
+def import_users_command(**options):
+    """Create users from a file with username, email and password columns."""
+    import_file('users', **options)
+
+@import_cli.command('tasks')
+@import_options
+def import_tasks_command(**options):
+    """Create tasks from a file with title and creator (a username) columns."""
+    import_file('tasks', **options)
+
+def init_commands(app):
+    """Register the maintenance command groups with the Flask CLI."""
+    app.cli.add_command(uploads_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(import_cli)
@@ -1,9 +1,94 @@
+import os
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
 class Config:
     """Configuration class for the Flask application."""
     SECRET_KEY = 'your_secret_key_here'  # Replace with a secure random key
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///site.db'  # Path to your SQLite database
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///site.db')  # Path to your SQLite database
     SQLALCHEMY_TRACK_MODIFICATIONS = False  # Disable overhead of SQLAlchemy events
+    SQLALCHEMY_ENGINE_OPTIONS = {}  # Passed to create_engine; see ServerDatabaseConfig
+    SQLITE_PRAGMAS = {}  # PRAGMA name -> value applied on every SQLite connection
+    TASKS_PER_PAGE = 20  # Tasks shown per dashboard page (keyset paginated)
+    API_PAGE_LIMIT = 100  # Largest page the JSON API will return
+    API_BATCH_LIMIT = 500  # Most items accepted by one batch request
+    USER_DIRECTORY_TTL = 300  # Seconds before the cached user directory is reloaded
+    IDENTITY_CACHE_TTL = 30  # Seconds a logged-in user's identity is served from memory
+    # Full Werkzeug method string (algorithm and cost); stored hashes made with
+    # anything else are upgraded on the user's next successful login
+    PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+    PASSWORD_HASH_WORKERS = 2  # Hashing processes per app process; 0 hashes inline
+    # Login attempts allowed as (burst, refill per minute), checked before any hashing
+    LOGIN_THROTTLE_ENABLED = True
+    LOGIN_THROTTLE_CLIENT_LIMIT = (20, 30)  # Per remote address
+    LOGIN_THROTTLE_IDENTIFIER_LIMIT = (5, 5)  # Per email/username being tried
+    LOGIN_THROTTLE_STORE = None  # Path to a SQLite file to share buckets across processes
+    UPLOAD_FOLDER = os.path.join(basedir, 'static', 'uploads')  # Content-addressed profile pictures
+    MAX_AVATAR_BYTES = 2 * 1024 * 1024  # Largest profile picture accepted
+    MAX_CONTENT_LENGTH = 3 * 1024 * 1024  # Whole-request cap enforced by Werkzeug (413 above it)
+    UPLOAD_PRUNE_GRACE_SECONDS = 3600  # Unreferenced blobs younger than this are kept
+    STATIC_FINGERPRINT = True  # Serve static files under content-hashed names
+    STATIC_PRECOMPRESS = True  # Write .gz variants of text assets at startup
+    STATIC_IMMUTABLE_MAX_AGE = 31536000  # One year for fingerprinted and hashed files
+    SSE_HEARTBEAT_SECONDS = 15  # Keep-alive comment interval on idle dashboard event streams
+    SSE_RETRY_MS = 3000  # Reconnect delay suggested to EventSource clients
+    SSE_REPLAY_BUFFER = 100  # Recent events kept per user for replay after a reconnect
+    # Build the Flask-Admin interface at startup; ADMIN_ENABLED=0 lets workers and the CLI skip it
+    ADMIN_ENABLED = os.environ.get('ADMIN_ENABLED', '1') != '0'
+    ADMIN_COUNT_CACHE_TTL = 60  # Seconds an admin list's unfiltered row count is reused
+    ADMIN_EXACT_COUNT_LIMIT = 100000  # Above this many rows, use the database's estimate when it has one
+    METRICS_ENABLED = True  # Record per-endpoint latency, SQL and password-hash metrics
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Bearer token a scraper may send to /metrics
+    # Serve metrics on their own port (one worker process binds it) instead of at /metrics
+    METRICS_PORT = int(os.environ['METRICS_PORT']) if os.environ.get('METRICS_PORT') else None
+    METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+    # Development aid: fingerprint each request's SQL to catch N+1 patterns, and log slow statements
+    QUERY_DEBUG = os.environ.get('QUERY_DEBUG', '').lower() in ('1', 'true', 'yes')
+    QUERY_REPEAT_LIMIT = 10  # More runs of one statement shape per request than this is reported
+    QUERY_REPEAT_ACTION = 'warn'  # 'warn' logs it; 'raise' fails the request with RepeatedQueryError
+    SLOW_QUERY_SECONDS = 0.25  # Statements at least this slow are logged with their EXPLAIN plan
+
+class SQLiteWALConfig(Config):
+    """SQLite tuned so concurrent requests stop failing with "database is locked".
+
+    WAL lets readers and the single writer proceed at the same time, and
+    busy_timeout makes writers queue for the lock instead of erroring.
+    """
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',  # Safe with WAL; fsync at checkpoints, not every commit
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'cache_size': -64000,  # 64 MB page cache per connection
+        'mmap_size': 268435456,  # Read through a 256 MB memory map
+        'temp_store': 'MEMORY',
+    }
+
+class ServerDatabaseConfig(Config):
+    """Pooled connections to a server database (PostgreSQL, MySQL) given by DATABASE_URL."""
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_pre_ping': True,  # Replace connections the server has dropped
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),  # Seconds
+    }
+
+# Engine profiles selectable with the DATABASE_PROFILE environment variable
+DATABASE_PROFILES = {
+    'sqlite': Config,
+    'sqlite-wal': SQLiteWALConfig,
+    'server': ServerDatabaseConfig,
+}
+
+def config_from_environment():
+    """Return the config class named by DATABASE_PROFILE (defaults to SQLite in WAL mode)."""
+    return DATABASE_PROFILES[os.environ.get('DATABASE_PROFILE', 'sqlite-wal')]
+
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # In-memory database for testing
-    WTF_CSRF_ENABLED = False  # Disable CSRF for testing
\ No newline at end of file
+    WTF_CSRF_ENABLED = False  # Disable CSRF for testing
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'  # Cheap hashes keep the suite fast
+    PASSWORD_HASH_WORKERS = 0
+    QUERY_DEBUG = True  # So the suite fails on N+1 regressions
+    QUERY_REPEAT_ACTION = 'raise'
\ No newline at end of file
@@ -0,0 +1,19 @@
+from sqlalchemy import event
+from models import db
+
+def init_engine(app):
+    """Apply the configured SQLITE_PRAGMAS to every new SQLite connection."""
+    pragmas = app.config['SQLITE_PRAGMAS']
+    if not pragmas:
+        return
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
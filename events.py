@@ -0,0 +1,149 @@
+import itertools
+import json
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from cache import directory_entry
+from models import Task
+
+# Task columns whose changes are pushed to open dashboards
+DELTA_FIELDS = ('title', 'description', 'priority', 'task_type', 'due_date', 'start_time', 'end_time', 'assignee_id')
+
+class EventBroker:
+    """In-process pub/sub of small task deltas, addressed to users.
+
+    Every event gets an increasing id and is kept in a short per-user ring
+    buffer, so a reconnecting client that sends Last-Event-ID can be caught up
+    without reloading. Subscribers only exist in the process that serves
+    their stream; events published by other worker processes are not seen.
+    """
+
+    def __init__(self, buffer_size):
+        self.buffer_size = buffer_size
+        # Ids start from the clock so a client that saw an earlier process is recognisably behind
+        self.first_id = int(time.time() * 1000)
+        self._ids = itertools.count(self.first_id)
+        self._lock = threading.Lock()
+        self._history = defaultdict(lambda: deque(maxlen=self.buffer_size))  # user_id -> events
+        self._trimmed = {}  # user_id -> newest event id pushed out of the buffer
+        self._subscribers = defaultdict(set)  # user_id -> queues
+
+    def publish(self, user_ids, name, data):
+        """Queue one event for each of the given users."""
+        payload = json.dumps(data)
+        with self._lock:
+            event = (next(self._ids), name, payload)
+            for user_id in set(user_ids):
+                if user_id is None:
+                    continue
+                history = self._history[user_id]
+                if len(history) == self.buffer_size:
+                    self._trimmed[user_id] = history[0][0]
+                history.append(event)
+                for subscriber in self._subscribers.get(user_id, ()):
+                    subscriber.put(event)
+
+    def subscribe(self, user_id, last_event_id=None):
+        """Register a listener; returns its queue and the events it missed.
+
+        Missed events are None when the client is too far behind for the ring
+        buffer, in which case it should reload the page.
+        """
+        subscriber = queue.SimpleQueue()
+        with self._lock:
+            self._subscribers[user_id].add(subscriber)
+            if last_event_id is None:
+                return subscriber, []
+            if last_event_id < self.first_id - 1 or last_event_id < self._trimmed.get(user_id, 0):
+                return subscriber, None
+            return subscriber, [event for event in self._history.get(user_id, ()) if event[0] > last_event_id]
+
+    def unsubscribe(self, user_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+def format_event(event):
+    """Encode an (id, name, payload) event in the text/event-stream format."""
+    event_id, name, payload = event
+    return f'id: {event_id}\nevent: {name}\ndata: {payload}\n\n'
+
+def task_events():
+    """Return the event broker for the current app."""
+    return current_app.extensions['task_events']
+
+def task_delta(values):
+    """JSON-ready copy of changed task values, naming the assignee if it changed."""
+    delta = {name: value.isoformat() if hasattr(value, 'isoformat') else value for name, value in values.items()}
+    if 'assignee_id' in delta:
+        entry = directory_entry(delta['assignee_id'])
+        delta['assignee'] = entry.username if entry else None
+    return delta
+
+def queue_task_event(session, action, delta, recipients):
+    """Publish a task event to `recipients` once the session's transaction commits.
+
+    ORM changes to tasks are queued automatically; set-based UPDATE/DELETE
+    statements bypass the unit of work and must call this themselves.
+    """
+    session.info.setdefault('task_events', []).append((recipients, {'action': action, 'task': delta}))
+
+def queue_task_update(session, delta, user_id, assignee_id, previous_assignee_id):
+    """Queue the events for a change to one task, given its creator and old and new assignee.
+
+    The creator and an unchanged assignee get the `delta`. On reassignment
+    the new assignee has no card for the task yet, so they are sent
+    `created` instead, and the previous assignee `deleted`.
+    """
+    if assignee_id == previous_assignee_id:
+        queue_task_event(session, 'updated', delta, (user_id, assignee_id))
+        return
+    queue_task_event(session, 'updated', delta, (user_id,))
+    if assignee_id not in (user_id, None):
+        queue_task_event(session, 'created', {'id': delta['id']}, (assignee_id,))
+    if previous_assignee_id not in (user_id, None):
+        queue_task_event(session, 'deleted', {'id': delta['id']}, (previous_assignee_id,))
+
+def init_events(app):
+    """Attach the task event broker to the application."""
+    app.extensions['task_events'] = EventBroker(app.config['SSE_REPLAY_BUFFER'])
+
+# Deltas are built while the flushed values are at hand and only published
+# after commit, so dashboards never see a change that was rolled back.
+@event.listens_for(Session, 'after_flush')
+def _track_task_changes(session, flush_context):
+    for task in session.new:
+        if isinstance(task, Task):
+            queue_task_event(session, 'created', {'id': task.id}, (task.user_id, task.assignee_id))
+    for task in session.deleted:
+        if isinstance(task, Task):
+            queue_task_event(session, 'deleted', {'id': task.id}, (task.user_id, task.assignee_id))
+    for task in session.dirty:
+        if not isinstance(task, Task) or not session.is_modified(task):
+            continue
+        state = inspect(task)
+        changed = {name: getattr(task, name) for name in DELTA_FIELDS if state.attrs[name].history.has_changes()}
+        if not changed:
+            continue
+        previous = state.attrs.assignee_id.history.deleted
+        queue_task_update(session, task_delta(dict(changed, id=task.id)), task.user_id, task.assignee_id,
+                          previous[0] if previous else task.assignee_id)
+
+@event.listens_for(Session, 'after_commit')
+def _publish_task_events(session):
+    queued = session.info.pop('task_events', None)
+    if queued and 'task_events' in current_app.extensions:
+        broker = task_events()
+        for recipients, data in queued:
+            broker.publish(recipients, 'task', data)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_task_events(session):
+    session.info.pop('task_events', None)
@@ -0,0 +1,99 @@
+import csv
+import json
+from datetime import date, datetime, time, timedelta
+from sqlalchemy.orm import aliased
+from models import Task, User, db
+
+# Leading characters that make a spreadsheet treat a CSV cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+class _Line:
+    """File-like target that hands back whatever csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+def task_rows(since=None, until=None, department=None, assignee_id=None, batch_size=1000):
+    """Yield the export header and then one tuple per task, streamed in batches.
+
+    Tasks count for the department of their assignee, or of their creator
+    when unassigned. Dates filter on date_created; `until` is inclusive.
+    """
+    creator, assignee = aliased(User), aliased(User)
+    worker_department = db.case((Task.assignee_id.isnot(None), assignee.department), else_=creator.department)
+    columns = (Task.id, Task.title, Task.description, Task.priority, Task.task_type, Task.status,
+               Task.due_date, Task.start_time, Task.end_time, Task.duration_seconds, Task.date_created,
+               creator.username.label('creator'), assignee.username.label('assignee'),
+               worker_department.label('department'))
+    select = (db.select(*columns).join(creator, creator.id == Task.user_id)
+              .outerjoin(assignee, assignee.id == Task.assignee_id))
+    select = select.where(*_created_between(Task.date_created, since, until))
+    if department:
+        select = select.where(worker_department == department)
+    if assignee_id is not None:
+        select = select.where(Task.assignee_id == assignee_id)
+    yield from _stream(select.order_by(Task.id), batch_size)
+
+def user_rows(since=None, until=None, department=None, assignee_id=None, batch_size=1000):
+    """Yield the export header and then one tuple per user; password hashes are never exported."""
+    columns = (User.id, User.username, User.email, User.first_name, User.middle_name, User.last_name,
+               User.department, User.phone_number, User.status, User.is_admin, User.date_created)
+    select = db.select(*columns).where(*_created_between(User.date_created, since, until))
+    if department:
+        select = select.where(User.department == department)
+    yield from _stream(select.order_by(User.id), batch_size)
+
+def _created_between(column, since, until):
+    criteria = []
+    if since:
+        criteria.append(column >= datetime.combine(since, time.min))
+    if until:
+        criteria.append(column < datetime.combine(until + timedelta(days=1), time.min))
+    return criteria
+
+def _stream(select, batch_size):
+    # yield_per fetches from the cursor in batches (a server-side cursor where
+    # the driver has one), so memory stays flat however many rows match
+    result = db.session.execute(select.execution_options(yield_per=batch_size))
+    yield tuple(result.keys())
+    yield from result
+
+def as_csv(rows, rows_per_chunk=500):
+    """Encode export rows as CSV text chunks, several rows per chunk."""
+    writer = csv.writer(_Line())
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow([_csv_cell(value) for value in row]))
+        if len(chunk) >= rows_per_chunk:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+def as_ndjson(rows, rows_per_chunk=500):
+    """Encode export rows as newline-delimited JSON objects, keyed by the header row."""
+    rows = iter(rows)
+    header = next(rows)
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(dict(zip(header, map(_plain, row)))) + '\n')
+        if len(chunk) >= rows_per_chunk:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+def _csv_cell(value):
+    if value is None:
+        return ''
+    value = _plain(value)
+    # Any user can set titles and descriptions; a spreadsheet would run text like =HYPERLINK(...) as a formula
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+EXPORTS = {'tasks': task_rows, 'users': user_rows}
+FORMATS = {'csv': (as_csv, 'text/csv'), 'ndjson': (as_ndjson, 'application/x-ndjson')}
@@ -0,0 +1,213 @@
+import csv
+import json
+import os
+from datetime import datetime
+from itertools import islice
+from cache import user_directory
+from models import PRIORITY_CHOICES, TASK_TYPE_CHOICES, Task, TaskState, TaskType, User, db
+from passwords import hash_passwords
+from rollups import adjust_rollups
+
+USER_FIELDS = ('username', 'email', 'first_name', 'middle_name', 'last_name', 'department', 'phone_number', 'address')
+TASK_TIMES = ('due_date', 'start_time', 'end_time', 'date_created')
+TASK_FIELDS = ('title', 'description', 'priority', 'task_type', 'creator', 'assignee') + TASK_TIMES
+PRIORITIES = {value for value, _ in PRIORITY_CHOICES}
+TASK_TYPES = {value for value, _ in TASK_TYPE_CHOICES}
+
+class MalformedRecord:
+    """Stands in for an NDJSON line that is not valid JSON, so it is skipped like any other bad record."""
+
+    def __init__(self, reason):
+        self.reason = reason
+
+def read_records(path, format=None):
+    """Yield one dict per record of a CSV or NDJSON file; empty CSV cells become None.
+
+    The format follows the file extension (.ndjson or .jsonl, otherwise CSV)
+    unless given. A line that does not parse yields a MalformedRecord rather
+    than ending the import, which could then never get past it.
+    """
+    if format is None:
+        format = 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+    with open(path, newline='', encoding='utf-8') as source:
+        if format == 'csv':
+            for record in csv.DictReader(source):
+                yield {key: value if value != '' else None for key, value in record.items()}
+        else:
+            for line in source:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        yield MalformedRecord('invalid JSON')
+
+def _well_formed(records, first, fields, model):
+    """Number the records and split off those that are not objects with text `fields` that fit `model`.
+
+    Returns ([(record number, record)], [(record number, reason)]); NDJSON
+    lines can hold any JSON value, which the importers must not trip over,
+    and one value too long for its column would fail the whole chunk's
+    INSERT on databases that enforce lengths.
+    """
+    columns = model.__table__.columns
+    lengths = {name: columns[name].type.length for name in fields
+               if name in columns and getattr(columns[name].type, 'length', None)}
+    numbered, skipped = [], []
+    for number, record in enumerate(records, first):
+        if isinstance(record, MalformedRecord):
+            skipped.append((number, record.reason))
+            continue
+        if not isinstance(record, dict):
+            skipped.append((number, 'not an object'))
+            continue
+        wrong = [name for name in fields if not isinstance(record.get(name), (str, type(None)))]
+        too_long = [name for name, length in lengths.items() if name not in wrong and len(record.get(name) or '') > length]
+        if wrong:
+            skipped.append((number, f"{', '.join(wrong)} must be text"))
+        elif too_long:
+            skipped.append((number, ', '.join(f'{name} is longer than {lengths[name]} characters' for name in too_long)))
+        else:
+            numbered.append((number, record))
+    return numbered, skipped
+
+def import_users(records, first):
+    """Bulk insert one chunk of user records and return [(record number, reason)] for those skipped.
+
+    Usernames and emails already taken, in the database or earlier in the
+    file, are looked up with one query for the whole chunk. Records carry a
+    plain `password`, hashed across the password worker pool.
+    """
+    numbered, skipped = _well_formed(records, first, USER_FIELDS + ('password',), User)
+    usernames = {record.get('username') for _, record in numbered}
+    emails = {record.get('email') for _, record in numbered}
+    taken_usernames, taken_emails = set(), set()
+    for username, email in db.session.execute(
+        db.select(User.username, User.email).where(User.username.in_(usernames) | User.email.in_(emails))
+    ):
+        taken_usernames.add(username)
+        taken_emails.add(email)
+
+    accepted = []
+    for number, record in numbered:
+        username, email = record.get('username'), record.get('email')
+        if not username or not 2 <= len(username) <= 150:
+            skipped.append((number, 'username must be 2 to 150 characters'))
+        elif not email or '@' not in email:
+            skipped.append((number, 'invalid email'))
+        elif not record.get('password'):
+            skipped.append((number, 'missing password'))
+        elif username in taken_usernames:
+            skipped.append((number, f'username {username} already exists'))
+        elif email in taken_emails:
+            skipped.append((number, f'email {email} already exists'))
+        else:
+            taken_usernames.add(username)
+            taken_emails.add(email)
+            accepted.append(record)
+
+    if accepted:
+        hashes = hash_passwords([record['password'] for record in accepted])
+        rows = [dict({name: record.get(name) for name in USER_FIELDS},
+                     department=record.get('department') or 'Unknown', password_hash=password_hash)
+                for record, password_hash in zip(accepted, hashes)]
+        db.session.execute(db.insert(User), rows)
+    return sorted(skipped)
+
+def import_tasks(records, first):
+    """Bulk insert one chunk of task records and return [(record number, reason)] for those skipped.
+
+    Creators and assignees are given by username and resolved with one query
+    for the whole chunk. The insert bypasses the ORM, so the status and the
+    rollups are filled in here; the search index follows through its triggers.
+    """
+    numbered, skipped = _well_formed(records, first, TASK_FIELDS, Task)
+    usernames = {record.get(name) for _, record in numbered for name in ('creator', 'assignee')} - {None}
+    user_ids = dict(db.session.execute(db.select(User.username, User.id).where(User.username.in_(usernames))).all())
+
+    rows = []
+    now = datetime.utcnow()
+    for number, record in numbered:
+        try:
+            times = {name: _parse_time(record.get(name)) for name in TASK_TIMES}
+        except ValueError as error:
+            skipped.append((number, str(error)))
+            continue
+        priority = record.get('priority') or 'low'
+        task_type = record.get('task_type') or TaskType.INDIVIDUAL.value
+        assignee = record.get('assignee')
+        if not record.get('title'):
+            skipped.append((number, 'missing title'))
+        elif record.get('creator') not in user_ids:
+            skipped.append((number, f"unknown creator {record.get('creator')}"))
+        elif assignee and assignee not in user_ids:
+            skipped.append((number, f'unknown assignee {assignee}'))
+        elif priority not in PRIORITIES or task_type not in TASK_TYPES:
+            skipped.append((number, 'invalid priority or task type'))
+        else:
+            rows.append(dict(
+                title=record['title'], description=record.get('description'), priority=priority,
+                task_type=task_type, user_id=user_ids[record['creator']],
+                assignee_id=user_ids[assignee] if assignee else None,
+                due_date=times['due_date'], start_time=times['start_time'], end_time=times['end_time'],
+                status=TaskState.for_times(times['start_time'], times['end_time']).value,
+                date_created=times['date_created'] or now, updated_at=now,
+            ))
+
+    if rows:
+        db.session.execute(db.insert(Task), rows)
+        adjust_rollups(db.session, [(None, (row['user_id'], row['assignee_id'], row['start_time'], row['end_time']))
+                                    for row in rows])
+    return sorted(skipped)
+
+def _parse_time(value):
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'invalid date {value!r}') from None
+
+def run_import(kind, records, chunk_size=500, start=0, on_chunk=None):
+    """Import `records` in chunks of `chunk_size`, committing each, and return the skipped records.
+
+    The first `start` records are passed over, for resuming. After every
+    commit `on_chunk(done, skipped)` is called with the number of records
+    handled so far, so the caller can report progress and save a checkpoint.
+    """
+    importer = IMPORTERS[kind]
+    records = islice(records, start, None)
+    done, skipped = start, []
+    while chunk := list(islice(records, chunk_size)):
+        chunk_skipped = importer(chunk, done + 1)
+        db.session.commit()
+        if kind == 'users':
+            user_directory().invalidate()
+        done += len(chunk)
+        skipped.extend(chunk_skipped)
+        if on_chunk:
+            on_chunk(done, chunk_skipped)
+    return skipped
+
+def read_checkpoint(path, source):
+    """The number of records of `source` already imported according to the checkpoint at `path`.
+
+    Returns 0 when there is no checkpoint, and raises ValueError when it was
+    written for another file or the file has changed size since.
+    """
+    try:
+        with open(path, encoding='utf-8') as checkpoint:
+            saved = json.load(checkpoint)
+    except FileNotFoundError:
+        return 0
+    if saved['source'] != os.path.abspath(source) or saved['size'] != os.path.getsize(source):
+        raise ValueError(f'{path} was written for another version of {saved["source"]}')
+    return saved['done']
+
+def write_checkpoint(path, source, done):
+    """Record that the first `done` records of `source` are imported."""
+    partial = path + '.tmp'
+    with open(partial, 'w', encoding='utf-8') as checkpoint:
+        json.dump({'source': os.path.abspath(source), 'size': os.path.getsize(source), 'done': done}, checkpoint)
+    os.replace(partial, path)  # Never leave a half-written checkpoint behind
+
+IMPORTERS = {'users': import_users, 'tasks': import_tasks}
@@ -0,0 +1,193 @@
+import hmac
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from flask import Response, abort, current_app, g, has_request_context, request
+from flask_login import current_user
+from sqlalchemy import event
+from werkzeug.serving import make_server
+from models import db
+from throttle import login_throttle
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+HASH_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+class Counter:
+    """A counter per label values, rendered in the Prometheus text format."""
+    kind = 'counter'
+
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, labels
+        self._values = defaultdict(int)  # Stays an int while only whole amounts are added
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield self.name, dict(zip(self.labels, label_values)), value
+
+class Histogram:
+    """Cumulative-bucket histograms per label values, rendered in the Prometheus text format."""
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels, buckets):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._values = {}  # label values -> [count per bucket..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        index = bisect_left(self.buckets, value)  # Bucket bounds are inclusive (le)
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                counts = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {label_values: list(counts) for label_values, counts in self._values.items()}
+        for label_values, counts in sorted(values.items()):
+            labels = dict(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', dict(labels, le=str(bound)), cumulative
+            yield f'{self.name}_sum', labels, counts[-1]
+            yield f'{self.name}_count', labels, cumulative
+
+class Metrics:
+    """The request, SQL and password-hashing metrics of one app process."""
+
+    def __init__(self):
+        self.request_seconds = Histogram('wfhome_http_request_duration_seconds',
+                                         'Time to produce a response, by endpoint.',
+                                         ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.responses = Counter('wfhome_http_responses_total', 'Responses by endpoint and status code.',
+                                 ('endpoint', 'method', 'status'))
+        self.queries = Histogram('wfhome_db_queries_per_request', 'SQL statements executed per request.',
+                                 ('endpoint',), QUERY_COUNT_BUCKETS)
+        self.query_seconds = Counter('wfhome_db_query_seconds_total', 'Time spent executing SQL, by endpoint.',
+                                     ('endpoint',))
+        self.password_seconds = Histogram('wfhome_password_hash_duration_seconds',
+                                          'Time to hash or verify a password, including any wait for a worker.',
+                                          ('operation',), HASH_BUCKETS)
+
+    def observe_password(self, operation, seconds):
+        self.password_seconds.observe((operation,), seconds)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        families = [self.request_seconds, self.responses, self.queries, self.query_seconds, self.password_seconds]
+        lines = []
+        for family in families:
+            lines.append(f'# HELP {family.name} {family.help}')
+            lines.append(f'# TYPE {family.name} {family.kind}')
+            lines.extend(_sample_line(*sample) for sample in family.samples())
+
+        lines.append('# HELP wfhome_login_throttle_rejections_total Login attempts refused by the throttle.')
+        lines.append('# TYPE wfhome_login_throttle_rejections_total counter')
+        throttle = login_throttle()
+        for kind in ('client', 'identifier'):
+            rejected = throttle.rejections[kind] if throttle else 0
+            lines.append(_sample_line('wfhome_login_throttle_rejections_total', {'kind': kind}, rejected))
+        return '\n'.join(lines) + '\n'
+
+def _sample_line(name, labels, value):
+    # Full precision, as the Prometheus client writes it; '{:g}' keeps only six digits
+    value = str(value) if isinstance(value, int) else repr(float(value))
+    if labels:
+        pairs = ','.join(f'{key}="{_escape(str(label))}"' for key, label in labels.items())
+        return f'{name}{{{pairs}}} {value}'
+    return f'{name} {value}'
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def metrics():
+    """Return the metrics of the current app (None when disabled)."""
+    return current_app.extensions.get('metrics')
+
+def _start_request():
+    g.metrics_request = [time.perf_counter(), 0, 0.0]  # start, statements, seconds in SQL
+
+def _finish_request(response):
+    started = g.pop('metrics_request', None)
+    if started is None:
+        return response
+    recorded = current_app.extensions['metrics']
+    endpoint = request.endpoint or 'unmatched'  # Never the raw path, which would add a series per URL
+    recorded.request_seconds.observe((endpoint, request.method), time.perf_counter() - started[0])
+    recorded.responses.inc((endpoint, request.method, str(response.status_code)))
+    recorded.queries.observe((endpoint,), started[1])
+    if started[2]:
+        recorded.query_seconds.inc((endpoint,), started[2])
+    return response
+
+def _before_statement(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, which a failed statement simply drops
+    if context is not None and has_request_context() and 'metrics_request' in g:
+        context.metrics_started = time.perf_counter()
+
+def _after_statement(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'metrics_started', None)
+    if started is not None:
+        g.metrics_request[1] += 1
+        g.metrics_request[2] += time.perf_counter() - started
+
+def metrics_view():
+    """The metrics text for a scrape by the admin or a holder of METRICS_TOKEN."""
+    token = current_app.config['METRICS_TOKEN']
+    sent = request.headers.get('Authorization', '')
+    # Compared as bytes: compare_digest refuses non-ASCII str, which any client can send
+    authorized = token and hmac.compare_digest(sent.encode(), f'Bearer {token}'.encode())
+    if not authorized and not (current_user.is_authenticated and current_user.username == 'admin'):
+        abort(403)
+    return Response(metrics().render(), content_type=CONTENT_TYPE)
+
+def serve_metrics(app, host, port):
+    """Serve the app's metrics, unauthenticated, on their own port from a daemon thread."""
+    def metrics_app(environ, start_response):
+        with app.app_context():
+            body = metrics().render().encode()
+        start_response('200 OK', [('Content-Type', CONTENT_TYPE), ('Content-Length', str(len(body)))])
+        return [body]
+
+    try:
+        server = make_server(host, port, metrics_app, threaded=True)
+    except OSError as error:
+        # Another worker process of this app already holds the port
+        logging.getLogger(__name__).warning('Metrics not served on %s:%s: %s', host, port, error)
+        return None
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
+
+def init_metrics(app):
+    """Record request, SQL and password-hash metrics and expose them.
+
+    Metrics are kept per process. With METRICS_PORT set they are served on
+    that port; otherwise at /metrics for the admin user or a scraper sending
+    METRICS_TOKEN as a bearer token.
+    """
+    if not app.config['METRICS_ENABLED']:
+        return
+    app.extensions['metrics'] = Metrics()
+    with app.app_context():
+        engine = db.engine
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    event.listen(engine, 'before_cursor_execute', _before_statement)
+    event.listen(engine, 'after_cursor_execute', _after_statement)
+    if app.config['METRICS_PORT']:
+        serve_metrics(app, app.config['METRICS_HOST'], app.config['METRICS_PORT'])
+    else:
+        app.add_url_rule('/metrics', 'metrics', metrics_view)
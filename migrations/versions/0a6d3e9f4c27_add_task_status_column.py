@@ -0,0 +1,33 @@
+"""Add indexed status column to Task model
+
+Revision ID: 0a6d3e9f4c27
+Revises: f2c8d6a4b915
+Create Date: 2026-10-18 16:31:09.442716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a6d3e9f4c27'
+down_revision = 'f2c8d6a4b915'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(length=20), nullable=False, server_default='open'))
+        batch_op.create_index(batch_op.f('ix_task_status'), ['status'], unique=False)
+
+    # Derive the status of existing tasks from their start and end times
+    op.execute("UPDATE task SET status = CASE WHEN end_time IS NOT NULL THEN 'done' "
+               "WHEN start_time IS NOT NULL THEN 'in_progress' ELSE 'open' END")
+
+
+def downgrade():
+    # Dropped in place rather than in batch mode: rebuilding the task table on
+    # SQLite would also drop the full-text index triggers
+    op.drop_index(op.f('ix_task_status'), table_name='task')
+    op.drop_column('task', 'status')
@@ -0,0 +1,30 @@
+"""Add indexes on task creator, assignee and due date
+
+Revision ID: 3f9c1d2e7b41
+Revises: a0f215cc89ed
+Create Date: 2026-10-18 09:12:40.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c1d2e7b41'
+down_revision = 'a0f215cc89ed'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_task_user_id'), ['user_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_task_assignee_id'), ['assignee_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_task_due_date'), ['due_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_task_due_date'))
+        batch_op.drop_index(batch_op.f('ix_task_assignee_id'))
+        batch_op.drop_index(batch_op.f('ix_task_user_id'))
@@ -0,0 +1,33 @@
+"""Replace task owner indexes with (owner, date_created) composites
+
+Revision ID: b8e2f4a61c03
+Revises: 3f9c1d2e7b41
+Create Date: 2026-10-18 10:04:11.873529
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e2f4a61c03'
+down_revision = '3f9c1d2e7b41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The composites serve both the plain owner lookups and keyset pagination
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.create_index('ix_task_user_id_date_created', ['user_id', 'date_created'], unique=False)
+        batch_op.create_index('ix_task_assignee_id_date_created', ['assignee_id', 'date_created'], unique=False)
+        batch_op.drop_index(batch_op.f('ix_task_user_id'))
+        batch_op.drop_index(batch_op.f('ix_task_assignee_id'))
+
+
+def downgrade():
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_task_assignee_id'), ['assignee_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_task_user_id'), ['user_id'], unique=False)
+        batch_op.drop_index('ix_task_assignee_id_date_created')
+        batch_op.drop_index('ix_task_user_id_date_created')
@@ -0,0 +1,29 @@
+"""Add updated_at column to Task model
+
+Revision ID: d41a7c9e2f56
+Revises: b8e2f4a61c03
+Create Date: 2026-10-18 13:21:05.204417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41a7c9e2f56'
+down_revision = 'b8e2f4a61c03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    # Existing rows count as last touched when they were created
+    op.execute('UPDATE task SET updated_at = date_created')
+
+
+def downgrade():
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,51 @@
+"""Add full-text index over task title and description
+
+Revision ID: e7b3a5c08d14
+Revises: d41a7c9e2f56
+Create Date: 2026-10-18 15:02:41.731208
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3a5c08d14'
+down_revision = 'd41a7c9e2f56'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        # External-content FTS5 table kept in sync by triggers
+        op.execute("CREATE VIRTUAL TABLE task_fts USING fts5("
+                   "title, description, content='task', content_rowid='id', tokenize='porter unicode61')")
+        op.execute("CREATE TRIGGER task_fts_insert AFTER INSERT ON task BEGIN "
+                   "INSERT INTO task_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END")
+        op.execute("CREATE TRIGGER task_fts_delete AFTER DELETE ON task BEGIN "
+                   "INSERT INTO task_fts (task_fts, rowid, title, description) "
+                   "VALUES ('delete', old.id, old.title, old.description); END")
+        op.execute("CREATE TRIGGER task_fts_update AFTER UPDATE OF title, description ON task BEGIN "
+                   "INSERT INTO task_fts (task_fts, rowid, title, description) "
+                   "VALUES ('delete', old.id, old.title, old.description); "
+                   "INSERT INTO task_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END")
+        # Index the tasks that already exist
+        op.execute("INSERT INTO task_fts (task_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        op.execute("ALTER TABLE task ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+                   "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+                   "setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED")
+        op.create_index('ix_task_search_vector', 'task', ['search_vector'], postgresql_using='gin')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for trigger in ('task_fts_insert', 'task_fts_delete', 'task_fts_update'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS task_fts')
+    elif dialect == 'postgresql':
+        op.drop_index('ix_task_search_vector', table_name='task')
+        op.execute('ALTER TABLE task DROP COLUMN search_vector')
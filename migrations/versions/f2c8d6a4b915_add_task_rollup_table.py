@@ -0,0 +1,38 @@
+"""Add task_rollup table of completed tasks per user, department and day
+
+Revision ID: f2c8d6a4b915
+Revises: e7b3a5c08d14
+Create Date: 2026-10-18 15:47:12.508831
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c8d6a4b915'
+down_revision = 'e7b3a5c08d14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Fill it afterwards with `flask rollups backfill`
+    op.create_table('task_rollup',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('department', sa.String(length=150), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('completed', sa.Integer(), nullable=False),
+    sa.Column('duration_seconds', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'department', 'day')
+    )
+    with op.batch_alter_table('task_rollup', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_task_rollup_day'), ['day'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('task_rollup', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_task_rollup_day'))
+
+    op.drop_table('task_rollup')
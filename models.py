@@ -1,11 +1,12 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.sql.functions import FunctionElement
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from passwords import hash_password, verify_password
 from enum import Enum
-from flask_admin.contrib.sqla import ModelView
-from flask_login import current_user
-from flask import redirect, url_for, request, flash
 
 # Initialize SQLAlchemy instance
 db = SQLAlchemy()
@@ -21,6 +22,44 @@ class TaskType(Enum):
     INDIVIDUAL = 'individual'
     GROUP = 'group'
 
+# Values and labels offered by the task forms and accepted by the importer
+PRIORITY_CHOICES = [('low', 'Low'), ('medium', 'Medium'), ('high', 'High')]
+TASK_TYPE_CHOICES = [('individual', 'Individual'), ('group', 'Group')]
+
+# Enum for task progress, derived from the start and end times
+class TaskState(Enum):
+    OPEN = 'open'
+    IN_PROGRESS = 'in_progress'
+    DONE = 'done'
+
+    @classmethod
+    def for_times(cls, start_time, end_time):
+        """The state of a task with the given start and end times."""
+        if end_time is not None:
+            return cls.DONE
+        return cls.IN_PROGRESS if start_time is not None else cls.OPEN
+
+class seconds_between(FunctionElement):
+    """SQL for the seconds from one timestamp to another (NULL if either is NULL)."""
+    name = 'seconds_between'
+    inherit_cache = True
+    type = db.Float()
+
+@compiles(seconds_between)
+def _seconds_between_sqlite(element, compiler, **kw):
+    start, end = (compiler.process(clause, **kw) for clause in element.clauses)
+    return f'((julianday({end}) - julianday({start})) * 86400.0)'
+
+@compiles(seconds_between, 'postgresql')
+def _seconds_between_postgresql(element, compiler, **kw):
+    start, end = (compiler.process(clause, **kw) for clause in element.clauses)
+    return f'EXTRACT(EPOCH FROM ({end} - {start}))'
+
+@compiles(seconds_between, 'mysql')
+def _seconds_between_mysql(element, compiler, **kw):
+    start, end = (compiler.process(clause, **kw) for clause in element.clauses)
+    return f'TIMESTAMPDIFF(SECOND, {start}, {end})'
+
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     is_admin = db.Column(db.Boolean, default = False)
@@ -45,10 +84,10 @@ class User(db.Model, UserMixin):
     assigned_tasks = db.relationship('Task', foreign_keys='Task.assignee_id', backref='assignee', lazy=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
     def __repr__(self):
         return (f"User('{self.username}', '{self.email}', '{self.first_name}', '{self.last_name}', "
@@ -56,21 +95,31 @@ class User(db.Model, UserMixin):
                 f"'Profile Picture: {self.profile_picture}')")
 
 class Task(db.Model):
+    # Composite indexes let each branch of the "my tasks" union walk a user's
+    # tasks in (date_created, id) order for keyset pagination.
+    __table_args__ = (
+        db.Index('ix_task_user_id_date_created', 'user_id', 'date_created'),
+        db.Index('ix_task_assignee_id_date_created', 'assignee_id', 'date_created'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
     priority = db.Column(db.String(20), nullable=False, default='low')
-    due_date = db.Column(db.DateTime, nullable=True)
+    due_date = db.Column(db.DateTime, nullable=True, index=True)
     task_type = db.Column(db.String(20), nullable=False, default=TaskType.INDIVIDUAL.value)
 
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)  # Creator of the task
     assignee_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Assigned user (optional)
 
     date_created = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # New fields for timer
     start_time = db.Column(db.DateTime, nullable=True)  # Task start time
     end_time = db.Column(db.DateTime, nullable=True)    # Task end time
+    # TaskState value, kept in step with start_time/end_time so it can be indexed
+    status = db.Column(db.String(20), nullable=False, default=TaskState.OPEN.value, index=True)
 
     @property
     def duration(self):
@@ -79,49 +128,156 @@ class Task(db.Model):
             return self.end_time - self.start_time
         return None  # Return None if duration cannot be calculated
 
+    @hybrid_property
+    def duration_seconds(self):
+        """The duration in seconds; usable in queries to filter and sort by it."""
+        duration = self.duration
+        return duration.total_seconds() if duration is not None else None
+
+    @duration_seconds.expression
+    def duration_seconds(cls):
+        return seconds_between(cls.start_time, cls.end_time)
+
+    @classmethod
+    def status_after(cls, start_time, end_time):
+        """SQL for the status once start_time/end_time hold the given expressions, for UPDATEs."""
+        return db.case((end_time.isnot(None), TaskState.DONE.value),
+                       (start_time.isnot(None), TaskState.IN_PROGRESS.value),
+                       else_=TaskState.OPEN.value)
+
+    def to_dict(self):
+        """Serialise the task for JSON responses."""
+        def isoformat(value):
+            return value.isoformat() if value else None
+
+        return {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'priority': self.priority,
+            'task_type': self.task_type,
+            'due_date': isoformat(self.due_date),
+            'start_time': isoformat(self.start_time),
+            'end_time': isoformat(self.end_time),
+            'user_id': self.user_id,
+            'assignee_id': self.assignee_id,
+            'date_created': isoformat(self.date_created),
+            'status': self.status,
+            'duration': self.duration_seconds,
+        }
+
+    @classmethod
+    def visible_to(cls, user_id):
+        """Query the tasks created by or assigned to a user.
+
+        The two branches are combined with UNION ALL so each one can use its
+        own index instead of scanning the table for an OR predicate. Tasks the
+        user assigned to themselves only come from the creator branch.
+        """
+        return cls.query.filter(cls.visible_criterion(user_id))
+
+    @classmethod
+    def visible_criterion(cls, user_id):
+        """SQL criterion for the tasks visible_to(user_id) returns, for use in other selects."""
+        created = db.select(cls.id).where(cls.user_id == user_id)
+        assigned = db.select(cls.id).where(cls.assignee_id == user_id, cls.user_id != user_id)
+        return cls.id.in_(db.union_all(created, assigned))
+
+    @classmethod
+    def freshness_for(cls, user_id):
+        """Return (newest updated_at, row count) over the tasks a user can see.
+
+        Any create, edit or delete of one of those tasks changes the pair, so
+        it makes a cheap validator for pages listing them.
+        """
+        def branch(*owner):
+            return db.select(db.func.max(cls.updated_at), db.func.count()).where(*owner)
+
+        rows = db.session.execute(db.union_all(
+            branch(cls.user_id == user_id), branch(cls.assignee_id == user_id, cls.user_id != user_id)
+        )).all()
+        return max((row[0] for row in rows if row[0]), default=None), sum(row[1] for row in rows)
+
+    @classmethod
+    def stamp_many(cls, column, task_ids, user_id, when):
+        """Set a time column on many tasks with one UPDATE and return the changed rows.
+
+        Only tasks the user created or was assigned, and whose column is still
+        empty, are touched, so re-submitting the same ids is harmless. Each
+        returned row carries the id, user_id, assignee_id, start_time and
+        end_time of a changed task, after the update.
+        """
+        times = {'start_time': cls.start_time, 'end_time': cls.end_time, column: db.literal(when)}
+        column = getattr(cls, column)
+        return db.session.execute(
+            db.update(cls)
+            .where(cls.id.in_(task_ids), db.or_(cls.user_id == user_id, cls.assignee_id == user_id),
+                   column.is_(None))
+            .values({column: when, cls.status: cls.status_after(**times)})
+            .returning(cls.id, cls.user_id, cls.assignee_id, cls.start_time, cls.end_time)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+    @classmethod
+    def state_criterion(cls, state):
+        """SQL criterion matching tasks in the given TaskState."""
+        return cls.status == state.value
+
+    @classmethod
+    def page_visible_to(cls, user_id, limit, after=None, criteria=(), sort=None):
+        """Return one keyset page of a user's tasks, newest first.
+
+        `sort` is an optional non-NULL SQL expression to order by (descending)
+        ahead of the creation time. `after` is the cursor of the last task on
+        the previous page: its (date_created, id), preceded by its sort value
+        when sorting. Each branch is ordered and limited before the union, so
+        a page reads at most 2 * (limit + 1) rows however much history the
+        user has. Returns the tasks and the cursor for the next page (or None).
+        """
+        keys = (cls.date_created, cls.id) if sort is None else (sort, cls.date_created, cls.id)
+        order = [key.desc() for key in keys]
+        where = list(criteria)
+        if after is not None:
+            where.append(db.tuple_(*keys) < tuple(after))
+
+        def branch(*owner):
+            return (db.select(cls.id).where(*owner, *where)
+                    .order_by(*order).limit(limit + 1).subquery())
+
+        created = branch(cls.user_id == user_id)
+        assigned = branch(cls.assignee_id == user_id, cls.user_id != user_id)
+        ids = db.union_all(db.select(created.c.id), db.select(assigned.c.id))
+        # The assignee is shown on every card, so load it in the same query
+        rows = db.session.execute(
+            db.select(cls, *keys).options(db.joinedload(cls.assignee))
+            .where(cls.id.in_(ids)).order_by(*order).limit(limit + 1)
+        ).all()
+
+        tasks = [row[0] for row in rows[:limit]]
+        if len(rows) > limit:
+            return tasks, tuple(rows[limit - 1][1:])
+        return tasks, None
+
     def __repr__(self):
         return (f"Task('{self.title}', 'Assigned to user_id: {self.assignee_id if self.assignee_id else self.user_id}', "
                 f"'Priority: {self.priority}', 'Due Date: {self.due_date}', 'Duration: {self.duration}')")
                 
-# Custom ModelView for User model
-class UserModelView(ModelView):
-    # Control which columns are displayed in the list view
-    column_list = ('id', 'username', 'email', 'first_name', 'last_name', 'department', 'status', 'date_created')
-
-    # Specify which columns can be searched
-    column_searchable_list = ('username', 'email', 'first_name', 'last_name')
-
-    # Specify which columns can be filtered
-    column_filters = ('status', 'department')
-
-    # Make specific columns editable from the list view
-    column_editable_list = ('status', 'department')
-
-    # Set form fields for creating or editing users (excluding sensitive data like password_hash)
-    form_columns = ('username', 'email', 'first_name', 'middle_name', 'last_name', 'department', 
-                    'phone_number', 'address', 'status', 'profile_picture')
-
-    # Override is_accessible to restrict access to certain roles
-    def is_accessible(self):
-        # Replace with your condition to check admin rights (e.g., a role-based system)
-        return current_user.is_authenticated and getattr(current_user, 'is_admin', False)
-
-    # Redirect users who do not have access
-    def inaccessible_callback(self, name, **kwargs):
-        flash("You do not have permission to access this page.", "danger")
-        return redirect(url_for('auth.login', next=request.url))
-
-# Custom ModelView for Task model
-class TaskModelView(ModelView):
-    column_list = ('id', 'title', 'description', 'priority', 'due_date', 'task_type', 'creator', 'assignee', 'date_created', 'start_time', 'end_time')
-    column_searchable_list = ('title', 'description')
-    column_filters = ('priority', 'task_type', 'creator')
-    form_columns = ('title', 'description', 'priority', 'due_date', 'task_type', 'user_id', 'assignee_id', 'start_time', 'end_time')
-
-    def is_accessible(self):
-        # Replace with your condition to check admin rights (e.g., a role-based system)
-        return current_user.is_authenticated and getattr(current_user, 'is_admin', False)
-
-    def inaccessible_callback(self, name, **kwargs):
-        flash("You do not have permission to access this page.", "danger")
-        return redirect(url_for('auth.login', next=request.url))
\ No newline at end of file
+# Every ORM write re-derives the status; set-based UPDATEs use Task.status_after
+@event.listens_for(Task, 'before_insert')
+@event.listens_for(Task, 'before_update')
+def _derive_task_status(mapper, connection, task):
+    task.status = TaskState.for_times(task.start_time, task.end_time).value
+
+class TaskRollup(db.Model):
+    """Completed tasks and their summed durations per (user, department, day).
+
+    A task counts for its assignee, or its creator when unassigned, on the
+    day of its end_time, under that user's department when it was recorded.
+    Rows are maintained incrementally by rollups.py; `flask rollups backfill`
+    rebuilds them from the task table.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    department = db.Column(db.String(150), primary_key=True, default='')  # '' when the user has none
+    day = db.Column(db.Date, primary_key=True, index=True)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    duration_seconds = db.Column(db.Float, nullable=False, default=0)
@@ -0,0 +1,76 @@
+import atexit
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# One pool per process, created lazily so forked WSGI workers each get their own
+_pool = None
+_pool_pid = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+
+def _executor(workers):
+    global _pool, _pool_pid, _pool_slots
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_pid = os.getpid()
+            # Bound queued work so a login burst waits here instead of piling up in the pool
+            _pool_slots = threading.BoundedSemaphore(workers * 2)
+        return _pool, _pool_slots
+
+def _run(operation, func, *args):
+    """Run a hashing function in the pool, or inline when PASSWORD_HASH_WORKERS is 0."""
+    started = time.perf_counter()
+    workers = current_app.config['PASSWORD_HASH_WORKERS']
+    if not workers:
+        result = func(*args)
+    else:
+        pool, slots = _executor(workers)
+        with slots:
+            # The request thread releases the GIL while it waits on the worker process
+            result = pool.submit(func, *args).result()
+    # Reported apart from request latency, so slow logins can be told from slow queries
+    metrics = current_app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.observe_password(operation, time.perf_counter() - started)
+    return result
+
+def hash_password(password):
+    """Hash a password with the configured PASSWORD_HASH_METHOD."""
+    return _run('hash', generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+def hash_passwords(passwords):
+    """Hash many passwords at once, spread over every worker in the pool."""
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    workers = current_app.config['PASSWORD_HASH_WORKERS']
+    if not workers:
+        return [generate_password_hash(password, method) for password in passwords]
+    pool, _ = _executor(workers)
+    # Batch callers (the importer) own the pool while they run, so skip the request slots
+    return list(pool.map(generate_password_hash, passwords, repeat(method)))
+
+def verify_password(password_hash, password):
+    """Check a password against a stored hash."""
+    return _run('verify', check_password_hash, password_hash, password)
+
+@lru_cache(maxsize=None)
+def _stored_method(method):
+    # Werkzeug fills in default costs ('scrypt' is stored as 'scrypt:32768:8:1'),
+    # so take the prefix of a real hash rather than the configured string
+    return generate_password_hash('', method).split('$', 1)[0]
+
+def needs_rehash(password_hash):
+    """True if a stored hash was made with a different method or cost than configured."""
+    return not password_hash.startswith(_stored_method(current_app.config['PASSWORD_HASH_METHOD']) + '$')
+
+@atexit.register
+def shutdown_pool():
+    """Stop this process's hashing workers; multiprocessing children must call it, atexit does not run there."""
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.shutdown(wait=False, cancel_futures=True)
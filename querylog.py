@@ -0,0 +1,98 @@
+import logging
+import re
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# Literals and bound parameters, in the paramstyles of the drivers we support
+LITERALS = re.compile(r"'(?:[^']|'')*'|%\(\w+\)s|%s|:\w+|\$\d+|\b\d+(?:\.\d+)?\b")
+PARAMETER_LISTS = re.compile(r'\?(?:\s*,\s*\?)+')  # IN (?, ?, ?) of any length
+WHITESPACE = re.compile(r'\s+')
+EXPLAIN_PREFIXES = {'sqlite': 'EXPLAIN QUERY PLAN '}
+# Statements every supported database can explain; on PostgreSQL a failed EXPLAIN
+# (say of DDL run by `flask db upgrade`) would abort the caller's transaction
+EXPLAINABLE = re.compile(r'\s*(?:SELECT|INSERT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+
+class RepeatedQueryError(RuntimeError):
+    """Raised under QUERY_REPEAT_ACTION = 'raise' when a request repeats a statement shape too often."""
+
+def fingerprint(statement):
+    """The shape of a SQL statement: literals, parameters and IN lists collapsed to a single ?."""
+    shape = LITERALS.sub('?', statement)
+    shape = PARAMETER_LISTS.sub('?', shape)
+    return WHITESPACE.sub(' ', shape).strip()
+
+def route():
+    """The endpoint and method of the current request, for attributing statements."""
+    if has_request_context():
+        return f'{request.endpoint or "unmatched"} {request.method}'
+    return 'outside a request'
+
+def explain(connection, statement, parameters):
+    """The database's plan for a statement, run on a cursor of its own so the caller's result is untouched."""
+    if not EXPLAINABLE.match(statement):
+        return '(not a query; not explained)'
+    prefix = EXPLAIN_PREFIXES.get(connection.dialect.name, 'EXPLAIN ')
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return '\n'.join(' | '.join(str(value) for value in row) for row in cursor.fetchall())
+    except Exception as error:  # A plan is a diagnostic; don't fail the request over it
+        return f'(no plan: {error})'
+    finally:
+        cursor.close()
+
+def _start_request():
+    g.query_shapes = Counter()
+
+def _check_request(app, response):
+    shapes = g.pop('query_shapes', None)
+    if not shapes:
+        return response
+    limit = app.config['QUERY_REPEAT_LIMIT']
+    repeated = [(count, shape) for shape, count in shapes.most_common() if count > limit]
+    if repeated:
+        details = '\n'.join(f'  {count} x {shape}' for count, shape in repeated)
+        message = f'{route()} ran the same statement more than {limit} times (likely N+1):\n{details}'
+        if app.config['QUERY_REPEAT_ACTION'] == 'raise':
+            raise RepeatedQueryError(message)
+        logger.warning(message)
+    return response
+
+def init_querylog(app):
+    """Watch SQL for N+1 patterns and slow statements when QUERY_DEBUG is on.
+
+    Every statement a request runs is fingerprinted; a shape repeated more
+    than QUERY_REPEAT_LIMIT times is logged, or raised under
+    QUERY_REPEAT_ACTION = 'raise'. Statements slower than SLOW_QUERY_SECONDS
+    are logged with their EXPLAIN plan and route.
+    """
+    if not app.config['QUERY_DEBUG']:
+        return
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.querylog_started = time.perf_counter()
+        if has_request_context() and 'query_shapes' in g:
+            g.query_shapes[fingerprint(statement)] += 1
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def log_slow_statement(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'querylog_started', None)
+        slow_seconds = app.config['SLOW_QUERY_SECONDS']
+        if started is None or slow_seconds is None:
+            return
+        elapsed = time.perf_counter() - started
+        if elapsed >= slow_seconds:
+            plan = explain(conn, statement, parameters) if not executemany else '(executemany; not explained)'
+            logger.warning('Slow query (%.3fs) in %s:\n%s\nPlan:\n%s', elapsed, route(), statement, plan)
+
+    app.before_request(_start_request)
+    app.after_request(lambda response: _check_request(app, response))
@@ -0,0 +1,165 @@
+from collections import defaultdict
+from datetime import timedelta
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from models import Task, TaskRollup, User, db
+
+# Task columns that decide whether, where and how much a task counts
+ROLLUP_FIELDS = ('user_id', 'assignee_id', 'start_time', 'end_time')
+UPSERT_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+def contribution(user_id, assignee_id, start_time, end_time):
+    """The (user_id, day, seconds) a task with these values adds to the rollup, or None if not completed."""
+    if end_time is None:
+        return None
+    seconds = (end_time - start_time).total_seconds() if start_time and end_time > start_time else 0.0
+    return assignee_id or user_id, end_time.date(), seconds
+
+def adjust_rollups(session, changes):
+    """Apply the net rollup change for tasks whose ROLLUP_FIELDS went from old to new values.
+
+    `changes` yields (old, new) pairs of (user_id, assignee_id, start_time,
+    end_time) tuples, with None for a side where the task did not exist. The
+    adjustment runs in the session's transaction, so it commits or rolls back
+    with the task change itself, and touches one row per (user, day).
+    """
+    buckets = defaultdict(lambda: [0, 0.0])  # (user_id, day) -> [completed, seconds]
+    for old, new in changes:
+        for values, sign in ((old, -1), (new, 1)):
+            counted = contribution(*values) if values is not None else None
+            if counted:
+                user_id, day, seconds = counted
+                buckets[user_id, day][0] += sign
+                buckets[user_id, day][1] += sign * seconds
+
+    connection = session.connection()
+    # Tasks that stop counting, or change while counted, come off the row they were counted in
+    counted = _counted_departments(connection, {key: max(-completed, 1) for key, (completed, seconds) in buckets.items()
+                                                if completed < 0 or (not completed and seconds)})
+    for (user_id, day), (completed, seconds) in buckets.items():
+        if completed or seconds:
+            _add_to_bucket(connection, user_id, day, completed, seconds, counted.get((user_id, day)))
+
+def _counted_departments(connection, needed):
+    """Map each (user_id, day) of `needed` to the department of the rollup row its tasks are counted in.
+
+    A user who changed department since can have rows for the same day under
+    both, so the row holding at least the `needed` count of tasks wins,
+    preferring the current department, then the fullest row. Pairs without
+    any row are left out.
+    """
+    if not needed:
+        return {}
+    rows = connection.execute(
+        db.select(TaskRollup.user_id, TaskRollup.day, TaskRollup.department, TaskRollup.completed,
+                  db.func.coalesce(User.department, '').label('current'))
+        .join(User, User.id == TaskRollup.user_id)
+        .where(TaskRollup.user_id.in_({user_id for user_id, _ in needed}),
+               TaskRollup.day.in_({day for _, day in needed}))
+    )
+    best = {}
+    for row in rows:
+        key = row.user_id, row.day
+        if key in needed:
+            rank = (row.completed >= needed[key], row.department == row.current, row.completed)
+            if key not in best or rank > best[key][0]:
+                best[key] = rank, row.department
+    return {key: department for key, (_, department) in best.items()}
+
+def _add_to_bucket(connection, user_id, day, completed, seconds, department=None):
+    if department is None:
+        # Read in the same statement, as the user's current department
+        department = db.select(db.func.coalesce(User.department, '')).where(User.id == user_id).scalar_subquery()
+    values = dict(user_id=user_id, department=department, day=day, completed=completed, duration_seconds=seconds)
+    upsert = UPSERT_DIALECTS.get(connection.dialect.name)
+    if upsert is not None:
+        insert = upsert(TaskRollup).values(values)
+        connection.execute(insert.on_conflict_do_update(
+            index_elements=['user_id', 'department', 'day'],
+            set_={'completed': TaskRollup.completed + insert.excluded.completed,
+                  'duration_seconds': TaskRollup.duration_seconds + insert.excluded.duration_seconds},
+        ))
+        return
+
+    updated = connection.execute(
+        db.update(TaskRollup)
+        .where(TaskRollup.user_id == user_id, TaskRollup.department == department, TaskRollup.day == day)
+        .values(completed=TaskRollup.completed + completed,
+                duration_seconds=TaskRollup.duration_seconds + seconds)
+    )
+    if not updated.rowcount:
+        connection.execute(db.insert(TaskRollup).values(values))
+
+def rollup_values(task):
+    """The ROLLUP_FIELDS of a task (or row) as an old/new value for adjust_rollups."""
+    return tuple(getattr(task, name) for name in ROLLUP_FIELDS)
+
+def rebuild_rollups(batch_size=1000):
+    """Recompute every rollup row from the task table and return the number of rows written.
+
+    Tasks are streamed in batches and only the per-(user, day) totals are
+    held in memory.
+    """
+    buckets = defaultdict(lambda: [0, 0.0])
+    rows = db.session.execute(
+        db.select(*(getattr(Task, name) for name in ROLLUP_FIELDS)).where(Task.end_time.isnot(None))
+        .execution_options(yield_per=batch_size)
+    )
+    for row in rows:
+        user_id, day, seconds = contribution(*row)
+        buckets[user_id, day][0] += 1
+        buckets[user_id, day][1] += seconds
+
+    departments = dict(db.session.execute(db.select(User.id, db.func.coalesce(User.department, ''))).all())
+    db.session.execute(db.delete(TaskRollup))
+    records = [dict(user_id=user_id, department=departments.get(user_id, ''), day=day,
+                    completed=completed, duration_seconds=seconds)
+               for (user_id, day), (completed, seconds) in buckets.items()]
+    if records:
+        db.session.execute(db.insert(TaskRollup), records)
+    db.session.commit()
+    return len(records)
+
+def hours_report(first_day, days=7):
+    """Completed tasks and hours per department and user for `days` days from `first_day`.
+
+    Returns rows of (department, user_id, username, completed, hours), read
+    from the rollup table only.
+    """
+    return db.session.execute(
+        db.select(TaskRollup.department, TaskRollup.user_id, User.username,
+                  db.func.sum(TaskRollup.completed).label('completed'),
+                  (db.func.sum(TaskRollup.duration_seconds) / 3600.0).label('hours'))
+        .join(User, User.id == TaskRollup.user_id)
+        .where(TaskRollup.day >= first_day, TaskRollup.day < first_day + timedelta(days=days))
+        .group_by(TaskRollup.department, TaskRollup.user_id, User.username)
+        .having(db.func.sum(TaskRollup.completed) != 0)
+        .order_by(TaskRollup.department, User.username)
+    ).all()
+
+# ORM writes to tasks (routes, the JSON API, Flask-Admin) keep the rollups in
+# step within the same flush; set-based statements call adjust_rollups themselves.
+@event.listens_for(Session, 'after_flush')
+def _roll_up_task_changes(session, flush_context):
+    changes = []
+    for task in session.new:
+        if isinstance(task, Task):
+            changes.append((None, rollup_values(task)))
+    for task in session.deleted:
+        if isinstance(task, Task):
+            changes.append((_flushed_from(task), None))
+    for task in session.dirty:
+        if isinstance(task, Task) and any(inspect(task).attrs[name].history.has_changes() for name in ROLLUP_FIELDS):
+            changes.append((_flushed_from(task), rollup_values(task)))
+    if changes:
+        adjust_rollups(session, changes)
+
+def _flushed_from(task):
+    # Values the row held before this flush
+    state = inspect(task)
+    old = []
+    for name in ROLLUP_FIELDS:
+        history = state.attrs[name].history
+        old.append(history.deleted[0] if history.deleted else getattr(task, name))
+    return tuple(old)
@@ -0,0 +1,88 @@
+import re
+from sqlalchemy import DDL, event
+from models import Task, db
+
+# Task titles weigh more than descriptions when ranking matches
+TITLE_WEIGHT, DESCRIPTION_WEIGHT = 10.0, 1.0
+TERM = re.compile(r'\w+')
+
+# SQLite: an FTS5 index over task(title, description) that triggers keep in
+# sync, so bulk statements that bypass the ORM are indexed too.
+SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS task_fts USING fts5("
+    "title, description, content='task', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS task_fts_insert AFTER INSERT ON task BEGIN "
+    "INSERT INTO task_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS task_fts_delete AFTER DELETE ON task BEGIN "
+    "INSERT INTO task_fts (task_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS task_fts_update AFTER UPDATE OF title, description ON task BEGIN "
+    "INSERT INTO task_fts (task_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO task_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END",
+)
+
+# PostgreSQL: a generated, weighted tsvector column with a GIN index
+POSTGRESQL_DDL = (
+    "ALTER TABLE task ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_task_search_vector ON task USING gin (search_vector)",
+)
+
+for statement in SQLITE_DDL:
+    event.listen(Task.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in POSTGRESQL_DDL:
+    event.listen(Task.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+event.listen(Task.__table__, 'after_drop', DDL('DROP TABLE IF EXISTS task_fts').execute_if(dialect='sqlite'))
+
+def fts5_query(text):
+    """Turn free text into a safe FTS5 query: every word must match, the last as a prefix.
+
+    Each word is quoted, so operators and stray quotes in user input can
+    never cause a syntax error. Returns None when there are no words.
+    """
+    terms = TERM.findall(text)
+    if not terms:
+        return None
+    quoted = ['"{}"'.format(term.replace('"', '""')) for term in terms]
+    quoted[-1] += '*'  # Match as the user types
+    return ' '.join(quoted)
+
+def _ranked_select(text, columns):
+    """A select of `columns` from tasks matching `text`, best matches first (None if no words)."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        query = fts5_query(text)
+        if query is None:
+            return None
+        index = db.table('task_fts', db.column('rowid'))
+        rank = db.func.bm25(db.literal_column('task_fts'), TITLE_WEIGHT, DESCRIPTION_WEIGHT)
+        return (db.select(*columns).join(index, index.c.rowid == Task.id)
+                .where(db.literal_column('task_fts').op('MATCH')(query)).order_by(rank))
+
+    if not TERM.search(text):
+        return None
+    if dialect == 'postgresql':
+        vector = db.literal_column('task.search_vector')
+        query = db.func.websearch_to_tsquery('english', text)
+        return (db.select(*columns).where(vector.op('@@')(query))
+                .order_by(db.func.ts_rank(vector, query).desc()))
+
+    # Other databases have no index here; fall back to matching every word with LIKE
+    criteria = [db.or_(Task.title.ilike(f'%{term}%'), Task.description.ilike(f'%{term}%'))
+                for term in TERM.findall(text)]
+    return db.select(*columns).where(*criteria).order_by(Task.date_created.desc())
+
+def search_tasks(text, user_id, limit):
+    """Return up to `limit` tasks visible to the user that match `text`, best first."""
+    select = _ranked_select(text, (Task,))
+    if select is None:
+        return []
+    select = select.where(Task.visible_criterion(user_id)).options(db.joinedload(Task.assignee)).limit(limit)
+    return db.session.scalars(select).all()
+
+def matching_task_ids(text):
+    """Subquery of the ids of every task matching `text`, for filtering other queries."""
+    select = _ranked_select(text, (Task.id,))
+    return select.order_by(None) if select is not None else db.select(Task.id).where(db.false())
@@ -1,17 +1,23 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, TextAreaField, SelectField, DateField, DateTimeLocalField, SubmitField
-from wtforms.validators import DataRequired, Optional, ValidationError
+from wtforms import StringField, TextAreaField, SelectField, DateField, DateTimeLocalField, IntegerField, FloatField, SubmitField
+from wtforms.validators import DataRequired, Optional, NumberRange, ValidationError
 from datetime import datetime
+from cache import user_directory
+from models import PRIORITY_CHOICES, TASK_TYPE_CHOICES
+
+STATE_CHOICES = [('open', 'Not started'), ('in_progress', 'In progress'), ('done', 'Done')]
+SORT_CHOICES = [('', 'Newest'), ('status', 'Status'), ('duration', 'Longest')]
 
 class TaskForm(FlaskForm):
     task_title = StringField('Task Title', validators=[DataRequired()])
     task_description = TextAreaField('Task Description', validators=[Optional()])
-    task_type = SelectField('Task Type', choices=[('individual', 'Individual'), ('group', 'Group')], validators=[DataRequired()])
-    priority = SelectField('Priority', choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High')], validators=[DataRequired()])
+    task_type = SelectField('Task Type', choices=TASK_TYPE_CHOICES, validators=[DataRequired()])
+    priority = SelectField('Priority', choices=PRIORITY_CHOICES, validators=[DataRequired()])
     due_date = DateField('Due Date (YYYY-MM-DD)', format='%Y-%m-%d', validators=[Optional()])
     start_time = DateTimeLocalField('Start Time (YYYY-MM-DD HH:MM)', format='%Y-%m-%dT%H:%M', validators=[Optional()])
     end_time = DateTimeLocalField('End Time (YYYY-MM-DD HH:MM)', format='%Y-%m-%dT%H:%M', validators=[Optional()])
-    assignee = SelectField('Assignee (optional)', coerce=int, validators=[Optional()])
+    # Picked through the /users/search typeahead rather than a <select> of every user
+    assignee_id = IntegerField('Assignee (optional)', validators=[Optional()])
     submit = SubmitField('Create Task')
 
     def validate_due_date(form, field):
@@ -26,4 +32,19 @@ class TaskForm(FlaskForm):
         if field.data and field.data < datetime.now():
             raise ValidationError('End time cannot be in the past.')
         if form.start_time.data and field.data and field.data < form.start_time.data:
-            raise ValidationError('End time cannot be before start time.')
\ No newline at end of file
+            raise ValidationError('End time cannot be before start time.')
+
+    def validate_assignee_id(form, field):
+        if field.data is not None and user_directory().get(field.data) is None:
+            raise ValidationError('Unknown assignee.')
+
+class TaskFilterForm(FlaskForm):
+    # Read from the query string, so there is no CSRF token to check
+    class Meta:
+        csrf = False
+
+    priority = SelectField('Priority', choices=[('', 'Any')] + PRIORITY_CHOICES, validators=[Optional()])
+    task_type = SelectField('Task Type', choices=[('', 'Any')] + TASK_TYPE_CHOICES, validators=[Optional()])
+    state = SelectField('Status', choices=[('', 'Any')] + STATE_CHOICES, validators=[Optional()])
+    min_hours = FloatField('Took at least (hours)', validators=[Optional(), NumberRange(min=0)])
+    sort = SelectField('Sort by', choices=SORT_CHOICES, validators=[Optional()])
@@ -1,41 +1,152 @@
-from flask import render_template, redirect, url_for, flash, request, abort
+from flask import render_template, redirect, url_for, flash, request, abort, current_app, make_response, session, Response
 from flask_login import login_required, current_user
-from .forms import TaskForm
-from models import Task, User
+from .forms import TaskForm, TaskFilterForm
+from models import Task, TaskState
+from events import task_events, format_event, queue_task_event, task_delta
+from search import search_tasks
+from rollups import adjust_rollups, rollup_values, ROLLUP_FIELDS
 from . import tasks
 from app import db
 from datetime import datetime
+import hashlib
+import queue
+import time
+
+CURSOR_FORMAT = '%Y%m%d%H%M%S%f'
+
+# Server-side sort orders: name -> (non-NULL sort expression, parser for its cursor value)
+TASK_SORTS = {
+    'status': (Task.status, str),
+    'duration': (db.func.coalesce(Task.duration_seconds, -1.0), float),  # Untimed tasks last
+}
+
+def encode_cursor(cursor):
+    """Serialise a keyset cursor for the query string.
+
+    Cursors are (date_created, id), preceded by the sort value when a
+    TASK_SORTS order is in use.
+    """
+    *sort_value, date_created, task_id = cursor
+    prefix = f'{sort_value[0]}~' if sort_value else ''
+    return f"{prefix}{date_created.strftime(CURSOR_FORMAT)}-{task_id}"
+
+def decode_cursor(value, sort=None):
+    """Parse a cursor produced by encode_cursor for the given sort, rejecting anything else."""
+    try:
+        if sort:
+            sort_value, value = value.rsplit('~', 1)
+        stamp, task_id = value.split('-')
+        cursor = (datetime.strptime(stamp, CURSOR_FORMAT), int(task_id))
+        return (TASK_SORTS[sort][1](sort_value), *cursor) if sort else cursor
+    except ValueError:
+        abort(400, 'Invalid page cursor.')
+
+def task_sort(filter_form):
+    """The sort expression chosen in a validated TaskFilterForm, or None for newest first."""
+    return TASK_SORTS[filter_form.sort.data][0] if filter_form.sort.data else None
+
+def task_criteria(filter_form):
+    """Build SQL criteria from a validated TaskFilterForm."""
+    criteria = []
+    if filter_form.priority.data:
+        criteria.append(Task.priority == filter_form.priority.data)
+    if filter_form.task_type.data:
+        criteria.append(Task.task_type == filter_form.task_type.data)
+    if filter_form.state.data:
+        criteria.append(Task.state_criterion(TaskState(filter_form.state.data)))
+    if filter_form.min_hours.data is not None:
+        criteria.append(Task.duration_seconds >= filter_form.min_hours.data * 3600)
+    return criteria
+
+def page_etag(*validators):
+    """Weak ETag for a GET of the current page, or None if it must not be reused.
+
+    Besides the caller's validators it covers the user, the query string and
+    the age of the CSRF token embedded in the page's forms.
+    """
+    if request.method != 'GET' or session.get('_flashes'):
+        return None  # Pending flash messages must be rendered
+    csrf_period = current_app.config.get('WTF_CSRF_TIME_LIMIT') or 3600
+    parts = (current_user.id, current_user.updated_at, request.full_path,
+             int(time.time() // (csrf_period / 2))) + validators
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+def not_modified(etag):
+    """A 304 response if the client already holds the page for `etag`, else None."""
+    if etag and request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+        response.set_etag(etag, weak=True)
+        return response
+    return None
+
+def queue_stamped(column, rows, when):
+    """Record the side effects of Task.stamp_many: live-update events and rollup changes."""
+    for row in rows:
+        queue_task_event(db.session, 'updated', task_delta({'id': row.id, column: when}),
+                         (row.user_id, row.assignee_id))
+    # The stamped column was empty before the update
+    adjust_rollups(db.session, [(tuple(None if name == column else getattr(row, name) for name in ROLLUP_FIELDS),
+                                 rollup_values(row)) for row in rows])
+
+def with_etag(body, etag):
+    """Wrap a rendered page so browsers revalidate it with If-None-Match."""
+    response = make_response(body)
+    if etag:
+        response.set_etag(etag, weak=True)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    return response
 
 @tasks.route('/dashboard', methods=['GET', 'POST'])
 @login_required
 def dashboard():
     """Display the dashboard and handle task creation."""
-    # Retrieve tasks for the current user (created by or assigned to)
-    user_tasks = Task.query.filter(
-        (Task.user_id == current_user.id) | (Task.assignee_id == current_user.id)
-    ).all()
+    # Answer a refresh of an unchanged dashboard before loading or rendering anything
+    etag = page_etag(*Task.freshness_for(current_user.id)) if request.method == 'GET' else None
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+
+    # Filters and the page cursor come from the query string
+    filter_form = TaskFilterForm(formdata=request.args)
+    valid = filter_form.validate()
+    criteria = task_criteria(filter_form) if valid else []
+    sort = filter_form.sort.data if valid else None
+    after = request.args.get('after')
+    after = decode_cursor(after, sort) if after else None
+
+    # Retrieve one page of tasks for the current user (created by or assigned to)
+    user_tasks, next_cursor = Task.page_visible_to(
+        current_user.id, current_app.config['TASKS_PER_PAGE'], after=after, criteria=criteria,
+        sort=task_sort(filter_form) if valid else None
+    )
+    filters = {name: value for name, value in filter_form.data.items() if value not in (None, '')}
+    next_url = url_for('tasks.dashboard', after=encode_cursor(next_cursor), **filters) if next_cursor else None
+    first_url = url_for('tasks.dashboard', **filters) if after else None
 
     form = TaskForm()  # Task creation form
-    # Populate assignee choices with user IDs and usernames
-    form.assignee.choices = [(user.id, user.username) for user in User.query.all()]
+
+    # New tasks announced over the event stream only belong on the unfiltered first page
+    context = dict(form=form, tasks=user_tasks, user=current_user, filter_form=filter_form,
+                   next_url=next_url, first_url=first_url, live_insert=not filters and after is None)
 
     if form.validate_on_submit():
         # Validation for date/time fields
         if form.due_date.data and form.due_date.data < datetime.today().date():
             flash('Due date cannot be in the past.', 'danger')
-            return render_template('dashboard.html', form=form, tasks=user_tasks, user=current_user)
+            return render_template('dashboard.html', **context)
 
         if form.start_time.data and form.start_time.data < datetime.now():
             flash('Start time cannot be in the past.', 'danger')
-            return render_template('dashboard.html', form=form, tasks=user_tasks, user=current_user)
+            return render_template('dashboard.html', **context)
 
         if form.end_time.data and form.end_time.data < datetime.now():
             flash('End time cannot be in the past.', 'danger')
-            return render_template('dashboard.html', form=form, tasks=user_tasks, user=current_user)
+            return render_template('dashboard.html', **context)
 
         if form.start_time.data and form.end_time.data and form.end_time.data < form.start_time.data:
             flash('End time cannot be before start time.', 'danger')
-            return render_template('dashboard.html', form=form, tasks=user_tasks, user=current_user)
+            return render_template('dashboard.html', **context)
 
         # Create a new task using form data
         task = Task(
@@ -47,7 +158,7 @@ def dashboard():
             end_time=form.end_time.data,  # Use form data directly if available
             task_type=form.task_type.data,
             user_id=current_user.id,  # Set the current user as the creator
-            assignee_id=form.assignee.data  # Assign task to the selected user
+            assignee_id=form.assignee_id.data  # Assign task to the selected user
         )
         db.session.add(task)
         db.session.commit()
@@ -55,18 +166,40 @@ def dashboard():
         return redirect(url_for('tasks.dashboard'))  # Redirect to the dashboard after creation
 
     # Render the dashboard with tasks and form
-    return render_template('dashboard.html', form=form, tasks=user_tasks, user=current_user)
+    return with_etag(render_template('dashboard.html', **context), etag)
+
+@tasks.route('/tasks/search')
+@login_required
+def search():
+    """Full-text search over the titles and descriptions of the user's tasks."""
+    query = request.args.get('q', '').strip()
+    results = search_tasks(query, current_user.id, current_app.config['TASKS_PER_PAGE']) if query else []
+    return render_template('task_search.html', query=query, tasks=results)
 
 @tasks.route('/task/edit/<int:task_id>', methods=['GET', 'POST'])
 @login_required
 def edit_task(task_id):
     """Edit an existing task."""
-    task = Task.query.get_or_404(task_id)
+    etag = None
+    if request.method == 'GET':
+        # Check ownership and freshness from three columns before loading the task
+        row = db.session.execute(
+            db.select(Task.user_id, Task.assignee_id, Task.updated_at).where(Task.id == task_id)
+        ).first()
+        if row is None:
+            abort(404)
+        if row.user_id != current_user.id and row.assignee_id != current_user.id:
+            abort(403)  # Forbidden if the user is not the creator or assignee
+        etag = page_etag(task_id, row.updated_at)
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+
+    task = db.get_or_404(Task, task_id)
     if task.user_id != current_user.id and task.assignee_id != current_user.id:
         abort(403)  # Forbidden if the user is not the creator or assignee
 
     form = TaskForm(obj=task)
-    form.assignee.choices = [(user.id, user.username) for user in User.query.all()]
 
     if form.validate_on_submit():
         task.title = form.task_title.data
@@ -76,12 +209,12 @@ def edit_task(task_id):
         task.start_time = form.start_time.data
         task.end_time = form.end_time.data
         task.task_type = form.task_type.data
-        task.assignee_id = form.assignee.data
+        task.assignee_id = form.assignee_id.data
         db.session.commit()
         flash('Task updated successfully!', 'success')
         return redirect(url_for('tasks.dashboard'))
 
-    return render_template('edit_task.html', form=form, task=task)
+    return with_etag(render_template('edit_task.html', form=form, task=task), etag)
 
 @tasks.route('/task/delete/<int:task_id>', methods=['POST'])
 @login_required
@@ -134,6 +267,28 @@ def complete_task(task_id):
         flash('Task has already been completed.', 'warning')
     return redirect(url_for('tasks.dashboard'))
 
+@tasks.route('/task/bulk/<action>', methods=['POST'])
+@login_required
+def bulk_task_action(action):
+    """Start or complete every selected task with a single UPDATE."""
+    columns = {'start': 'start_time', 'complete': 'end_time'}
+    if action not in columns:
+        abort(404)
+    # A repeated checkbox value must not be counted twice
+    task_ids = list(dict.fromkeys(request.form.getlist('task_ids', type=int)))[:current_app.config['API_BATCH_LIMIT']]
+    if not task_ids:
+        flash('Select at least one task.', 'warning')
+        return redirect(url_for('tasks.dashboard'))
+
+    now = datetime.utcnow()
+    changed = Task.stamp_many(columns[action], task_ids, current_user.id, now)
+    queue_stamped(columns[action], changed, now)
+    db.session.commit()
+    changed = len(changed)
+    verb = 'started' if action == 'start' else 'completed'
+    flash(f'{changed} of {len(task_ids)} selected tasks {verb}.', 'success' if changed else 'warning')
+    return redirect(url_for('tasks.dashboard'))
+
 @tasks.route('/end_task/<int:task_id>', methods=['POST'])
 @login_required
 def end_task(task_id):
@@ -149,4 +304,47 @@ def end_task(task_id):
     else:
         flash('Task has already been completed.', 'warning')
 
-    return redirect(url_for('tasks.dashboard'))
\ No newline at end of file
+    return redirect(url_for('tasks.dashboard'))
+
+@tasks.route('/task/<int:task_id>/card')
+@login_required
+def task_card(task_id):
+    """Render one dashboard card, for inserting a task announced over the event stream."""
+    task = db.get_or_404(Task, task_id)
+    if task.user_id != current_user.id and task.assignee_id != current_user.id:
+        abort(403)  # Forbidden if the user is not the creator or assignee
+    return render_template('_task_card.html', task=task)
+
+@tasks.route('/dashboard/events')
+@login_required
+def dashboard_events():
+    """Server-Sent Events stream of changes to the current user's tasks.
+
+    The generator only waits on an in-memory queue, so an idle connection
+    holds no database session; a comment line is sent every
+    SSE_HEARTBEAT_SECONDS to keep proxies from closing it.
+    """
+    broker = task_events()
+    user_id = current_user.id
+    heartbeat = current_app.config['SSE_HEARTBEAT_SECONDS']
+    retry = current_app.config['SSE_RETRY_MS']
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    subscriber, missed = broker.subscribe(user_id, last_event_id)
+
+    def stream():
+        try:
+            yield f'retry: {retry}\n\n'
+            if missed is None:
+                yield 'event: reset\ndata: {}\n\n'  # Too far behind to replay; the page reloads
+            for event in missed or ():
+                yield format_event(event)
+            while True:
+                try:
+                    yield format_event(subscriber.get(timeout=heartbeat))
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+        finally:
+            broker.unsubscribe(user_id, subscriber)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
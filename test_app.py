@@ -1,7 +1,28 @@
+import gzip
+import hashlib
+import io
+import json
+import os
 import pytest
+import re
+from urllib.request import urlopen
+from flask import url_for
+from sqlalchemy import event
 from app import create_app, db
-from config import TestingConfig  # Import the actual class, not a string
-from models import Task, User
+from config import TestingConfig, SQLiteWALConfig  # Import the actual class, not a string
+from models import Task, TaskRollup, User
+from rollups import hours_report
+from cache import identity_cache
+from metrics import serve_metrics
+from querylog import RepeatedQueryError, explain, fingerprint
+from benchmarks import load as load_driver, routes as route_benchmark, startup
+from assets import StaticAssets
+from throttle import MemoryBucketStore, SQLiteBucketStore
+from uploads import store_upload
+from werkzeug.datastructures import FileStorage
+from werkzeug.security import generate_password_hash
+from passwords import needs_rehash
+from datetime import datetime, timedelta
 
 @pytest.fixture
 def app():
@@ -28,7 +49,7 @@ def test_task_creation_and_notification(client):
     db.session.commit()
 
     client.post('/login', data={
-        'username': 'testuser',
+        'login_identifier': 'testuser',
         'password': 'password123'
     })
 
@@ -38,7 +59,7 @@ def test_task_creation_and_notification(client):
         'task_description': 'This is a test task.',
         'task_type': 'individual',
         'priority': 'high',
-        'due_date': '2024-11-10'
+        'due_date': (datetime.utcnow() + timedelta(days=7)).strftime('%Y-%m-%d')
     })
 
     # Check if the response indicates a successful redirect
@@ -51,4 +72,1011 @@ def test_task_creation_and_notification(client):
     print(response.data.decode('utf-8'))  # Decode bytes to string for better readability
 
     # Assert that the task creation success message is in the final response
-    assert b'Task created successfully!' in response.data  # Check if success message appears
\ No newline at end of file
+    assert b'Task created successfully!' in response.data  # Check if success message appears
+
+def test_dashboard_task_query_uses_indexes(client):
+    # Create a test user and log in
+    test_user = User(username='planner', email='planner@example.com')
+    test_user.set_password('password123')
+    db.session.add(test_user)
+    db.session.commit()
+
+    client.post('/login', data={
+        'login_identifier': 'planner',
+        'password': 'password123'
+    })
+
+    # Capture every statement the dashboard issues against the task table
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM task' in statement:
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        first_page = client.get('/dashboard')
+        filtered_page = client.get('/dashboard?priority=high&state=open&after=20240101000000000000-5')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+    assert first_page.status_code == 200
+    assert filtered_page.status_code == 200
+    assert statements
+
+    # No step of the query plan may fall back to a full scan of the task table
+    connection = db.session.connection()
+    for statement, parameters in statements:
+        plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+        scans = [row[3] for row in plan if row[3].startswith('SCAN') and 'task' in row[3]]
+        assert not scans, f'{statement} scans the task table: {scans}'
+
+def test_task_pages_cover_history_once(app):
+    owner = User(username='owner', email='owner@example.com', password_hash='x')
+    other = User(username='other', email='other@example.com', password_hash='x')
+    db.session.add_all([owner, other])
+    db.session.commit()
+
+    # Created, assigned and self-assigned tasks, many sharing a timestamp
+    created_at = datetime(2024, 1, 1)
+    expected = set()
+    for i in range(23):
+        creator, assignee = [(owner, None), (other, owner), (owner, owner)][i % 3]
+        task = Task(title=f'Task {i}', user_id=creator.id, assignee_id=assignee.id if assignee else None,
+                    date_created=created_at + timedelta(minutes=i // 4), priority='high' if i % 2 else 'low')
+        db.session.add(task)
+        db.session.flush()
+        expected.add(task.id)
+    db.session.add(Task(title='Not mine', user_id=other.id))
+    db.session.commit()
+
+    seen, after = [], None
+    while True:
+        page, after = Task.page_visible_to(owner.id, 5, after=after)
+        assert len(page) <= 5
+        seen.extend(task.id for task in page)
+        if after is None:
+            break
+    assert len(seen) == len(set(seen))
+    assert set(seen) == expected
+
+    # Filters are applied server-side inside each branch
+    page, _ = Task.page_visible_to(owner.id, 50, criteria=[Task.priority == 'high'])
+    assert page and all(task.priority == 'high' for task in page)
+
+def count_dashboard_queries(client):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        response = client.get('/dashboard')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+    assert response.status_code == 200
+    return len(statements)
+
+def test_dashboard_query_count_is_fixed(app, client):
+    app.config['TASKS_PER_PAGE'] = 500
+    test_user = User(username='busy', email='busy@example.com')
+    test_user.set_password('password123')
+    teammates = [User(username=f'mate{i}', email=f'mate{i}@example.com', password_hash='x') for i in range(50)]
+    db.session.add_all([test_user] + teammates)
+    db.session.commit()
+
+    client.post('/login', data={
+        'login_identifier': 'busy',
+        'password': 'password123'
+    })
+
+    db.session.add(Task(title='First', user_id=test_user.id, assignee_id=teammates[0].id))
+    db.session.commit()
+    baseline = count_dashboard_queries(client)
+
+    # 500 tasks spread over 50 different assignees
+    db.session.add_all([
+        Task(title=f'Task {i}', user_id=test_user.id, assignee_id=teammates[i % 50].id)
+        for i in range(499)
+    ])
+    db.session.commit()
+    db.session.expire_all()
+
+    assert count_dashboard_queries(client) == baseline
+
+def test_user_search_uses_cached_directory(app, client):
+    test_user = User(username='searcher', email='searcher@example.com', department='IT')
+    test_user.set_password('password123')
+    db.session.add_all([test_user, User(username='Sam', email='sam@example.com', password_hash='x', department='HR'),
+                        User(username='sally', email='sally@example.com', password_hash='x')])
+    db.session.commit()
+
+    client.post('/login', data={
+        'login_identifier': 'searcher',
+        'password': 'password123'
+    })
+
+    response = client.get('/users/search?q=sa')
+    assert [user['username'] for user in response.get_json()] == ['sally', 'Sam']
+    assert response.get_json()[1] == {'id': 2, 'username': 'Sam', 'department': 'HR'}
+
+    # Committed changes invalidate the cached directory
+    User.query.filter_by(username='sally').one().username = 'zoe'
+    db.session.commit()
+    assert [user['username'] for user in client.get('/users/search?q=sa').get_json()] == ['Sam']
+
+def test_identity_cache_serves_and_refreshes_current_user(app, client):
+    test_user = User(username='cached', email='cached@example.com')
+    test_user.set_password('password123')
+    db.session.add(test_user)
+    db.session.commit()
+
+    client.post('/login', data={
+        'login_identifier': 'cached',
+        'password': 'password123'
+    })
+    client.get('/dashboard')
+
+    # A warm identity means no user lookup on the next request
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        client.post('/task/start/1')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+    assert not [statement for statement in statements if 'FROM user' in statement]
+
+    # Editing the profile invalidates the cached identity
+    client.post('/profile', data={'first_name': 'Cache', 'last_name': 'User', 'department': 'Legal'})
+    assert identity_cache().get(test_user.id).department == 'Legal'
+
+def test_login_upgrades_outdated_password_hash(app, client):
+    test_user = User(username='legacy', email='legacy@example.com',
+                     password_hash=generate_password_hash('password123', 'pbkdf2:sha256:500'))
+    db.session.add(test_user)
+    db.session.commit()
+
+    client.post('/login', data={
+        'login_identifier': 'legacy',
+        'password': 'password123'
+    })
+
+    db.session.refresh(test_user)
+    assert test_user.password_hash.startswith(app.config['PASSWORD_HASH_METHOD'] + '$')
+    assert test_user.check_password('password123')
+
+def test_password_method_with_default_cost_is_not_rehashed(app):
+    # Werkzeug stores 'pbkdf2:sha256' with its default iteration count filled in
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256'
+    current = generate_password_hash('password123', 'pbkdf2:sha256')
+    assert current.count(':') == 2
+    assert not needs_rehash(current)
+    assert needs_rehash(generate_password_hash('password123', 'pbkdf2:sha256:500'))
+
+def test_password_hashing_in_worker_pool(app):
+    app.config['PASSWORD_HASH_WORKERS'] = 1
+    test_user = User(username='pooled', email='pooled@example.com')
+    test_user.set_password('password123')
+    assert test_user.check_password('password123')
+    assert not test_user.check_password('wrong')
+
+def test_login_throttle_rejects_before_hashing(app, client, monkeypatch):
+    app.extensions['login_throttle'].limits['identifier'] = (2, 1)
+    test_user = User(username='target', email='target@example.com')
+    test_user.set_password('password123')
+    db.session.add(test_user)
+    db.session.commit()
+
+    checks = []
+    check_password = User.check_password
+    monkeypatch.setattr(User, 'check_password', lambda self, password: checks.append(password) or check_password(self, password))
+
+    # Identifiers are throttled case-insensitively
+    statuses = [client.post('/login', data={'login_identifier': identifier, 'password': 'guess'}).status_code
+                for identifier in ('target', 'target', 'Target', 'TARGET')]
+
+    assert statuses == [200, 200, 429, 429]
+    assert len(checks) == 2
+    assert app.extensions['login_throttle'].rejections['identifier'] == 2
+
+def test_throttle_stores_drop_old_buckets(tmp_path):
+    memory = MemoryBucketStore(max_keys=3)
+    for i in range(5):
+        memory.take(f'identifier:{i}', 5, 1 / 60, 0.0)
+    assert list(memory._buckets) == ['identifier:2', 'identifier:3', 'identifier:4']
+    # Refilled buckets go as soon as anything else is taken
+    memory.take('identifier:new', 5, 1 / 60, 1000.0)
+    assert list(memory._buckets) == ['identifier:new']
+
+    shared = SQLiteBucketStore(str(tmp_path / 'throttle.db'), max_idle=3600)
+    shared.take('identifier:old', 5, 1 / 60, 0.0)
+    shared.take('identifier:new', 5, 1 / 60, 4000.0)
+    keys = shared._connection().execute('SELECT key FROM login_bucket').fetchall()
+    assert keys == [('identifier:new',)]
+
+def test_sqlite_wal_profile_sets_pragmas(tmp_path):
+    config_class = type('WALTestingConfig', (SQLiteWALConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'wal.db'}"
+    })
+    wal_app = create_app(config_class)
+    with wal_app.app_context():
+        connection = db.session.connection()
+        assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+        assert connection.exec_driver_sql('PRAGMA synchronous').scalar() == 1  # NORMAL
+        assert connection.exec_driver_sql('PRAGMA busy_timeout').scalar() == 5000
+        db.session.remove()
+        db.engine.dispose()
+
+def test_migrated_schema_matches_the_models(tmp_path):
+    from flask_migrate import Migrate, check, upgrade
+    config_class = type('MigratedConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'migrated.db'}"
+    })
+    migrated_app = create_app(config_class)
+    Migrate(migrated_app, db, directory=os.path.join(os.path.dirname(__file__), 'migrations'))
+    with migrated_app.app_context():
+        upgrade()
+        # Exits when autogenerate finds a difference, e.g. wanting to drop the task_fts tables
+        check()
+        db.engine.dispose()
+
+def test_api_batch_endpoints_report_per_item_results(client):
+    test_user = User(username='integrator', email='integrator@example.com')
+    test_user.set_password('password123')
+    stranger = User(username='stranger', email='stranger@example.com', password_hash='x')
+    db.session.add_all([test_user, stranger])
+    db.session.commit()
+    db.session.add(Task(title='Not mine', user_id=stranger.id))
+    db.session.commit()
+
+    assert client.get('/api/v1/tasks').status_code == 401
+    client.post('/login', data={
+        'login_identifier': 'integrator',
+        'password': 'password123'
+    })
+
+    response = client.post('/api/v1/tasks/batch', json={'tasks': [
+        {'title': 'First', 'priority': 'high', 'task_type': 'individual'},
+        {'title': '', 'priority': 'high', 'task_type': 'individual'},
+        {'title': 'Second', 'priority': 'urgent', 'task_type': 'group'},
+        {'title': 'Third', 'priority': 'low', 'task_type': 'group', 'assignee_id': stranger.id},
+    ]})
+    results = response.get_json()['results']
+    assert [result['status'] for result in results] == ['created', 'invalid', 'invalid', 'created']
+    assert 'title' in results[1]['errors'] and 'priority' in results[2]['errors']
+    first_id, third_id = results[0]['id'], results[3]['id']
+
+    response = client.patch('/api/v1/tasks/batch', json={'tasks': [
+        {'id': first_id, 'priority': 'low'},
+        {'id': third_id, 'assignee_id': 999},
+        {'id': 1, 'title': 'Hijacked'},
+        {'id': 12345, 'title': 'Missing'},
+    ]})
+    assert [result['status'] for result in response.get_json()['results']] == ['updated', 'invalid', 'forbidden', 'not_found']
+    assert client.get(f'/api/v1/tasks/{first_id}').get_json()['priority'] == 'low'
+    assert client.get(f'/api/v1/tasks/{first_id}').get_json()['title'] == 'First'
+
+    response = client.delete('/api/v1/tasks/batch', json={'ids': [first_id, 1]})
+    assert [result['status'] for result in response.get_json()['results']] == ['deleted', 'forbidden']
+    assert [task['id'] for task in client.get('/api/v1/tasks').get_json()['tasks']] == [third_id]
+
+def test_api_rejects_bad_ids_and_patches_that_reverse_the_times(client):
+    test_user = User(username='patcher', email='patcher@example.com')
+    test_user.set_password('password123')
+    db.session.add(test_user)
+    db.session.commit()
+    start = datetime.utcnow() + timedelta(days=2)
+    task = Task(title='Scheduled', user_id=test_user.id, start_time=start)
+    db.session.add(task)
+    db.session.commit()
+    client.post('/login', data={'login_identifier': 'patcher', 'password': 'password123'})
+
+    response = client.patch(f'/api/v1/tasks/{task.id}', json={
+        'end_time': (start - timedelta(days=1)).strftime('%Y-%m-%dT%H:%M')})
+    assert response.status_code == 400 and 'end_time' in response.get_json()['errors']
+    assert db.session.get(Task, task.id).end_time is None
+
+    response = client.patch('/api/v1/tasks/batch', json={'tasks': [{'id': task.id}, {'id': [1]}, 'x']})
+    assert response.status_code == 400
+    assert [result['index'] for result in response.get_json()['results']] == [1, 2]
+    response = client.delete('/api/v1/tasks/batch', json={'ids': [task.id, {'id': 1}, [2], True]})
+    assert response.status_code == 400
+    assert [result['index'] for result in response.get_json()['results']] == [1, 2, 3]
+    response = client.patch('/api/v1/tasks/batch', json={'tasks': [{'id': task.id}, {'id': task.id, 'title': 'Again'}]})
+    assert response.status_code == 400
+    assert response.get_json()['results'] == [{'index': 1, 'status': 'invalid', 'errors': {'id': ['Duplicate id.']}}]
+    assert db.session.get(Task, task.id) is not None
+
+def test_bulk_start_and_complete_in_one_update(client):
+    test_user = User(username='closer', email='closer@example.com')
+    test_user.set_password('password123')
+    stranger = User(username='outsider', email='outsider@example.com', password_hash='x')
+    db.session.add_all([test_user, stranger])
+    db.session.commit()
+    mine = [Task(title=f'Mine {i}', user_id=test_user.id) for i in range(3)]
+    theirs = Task(title='Theirs', user_id=stranger.id)
+    db.session.add_all(mine + [theirs])
+    db.session.commit()
+    mine[0].start_time = datetime(2024, 1, 1)
+    db.session.commit()
+
+    client.post('/login', data={
+        'login_identifier': 'closer',
+        'password': 'password123'
+    })
+
+    ids = [task.id for task in mine] + [theirs.id]
+    response = client.post('/task/bulk/start', data={'task_ids': ids + ids[1:2]}, follow_redirects=True)
+    assert b'2 of 4 selected tasks started.' in response.data
+
+    response = client.post('/task/bulk/complete', data={'task_ids': ids}, follow_redirects=True)
+    assert b'3 of 4 selected tasks completed.' in response.data
+
+    db.session.expire_all()
+    assert mine[0].start_time == datetime(2024, 1, 1)
+    assert all(task.start_time and task.end_time for task in mine)
+    assert theirs.start_time is None and theirs.end_time is None
+
+    # Ids go straight into the UPDATE, so anything but an integer is refused up front
+    response = client.post('/api/v1/tasks/batch/start', json={'ids': [theirs.id, 'x', [1], None]})
+    assert response.status_code == 400
+    assert [result['index'] for result in response.get_json()['results']] == [1, 2, 3]
+
+def test_profile_pictures_are_content_addressed(app, client, runner, tmp_path):
+    app.config.update(UPLOAD_FOLDER=str(tmp_path), MAX_AVATAR_BYTES=1024)
+    test_user = User(username='avatar', email='avatar@example.com')
+    test_user.set_password('password123')
+    db.session.add(test_user)
+    db.session.commit()
+
+    client.post('/login', data={
+        'login_identifier': 'avatar',
+        'password': 'password123'
+    })
+
+    def upload(content, filename):
+        return client.post('/profile', data={
+            'first_name': 'Ava', 'last_name': 'Tar', 'department': 'IT',
+            'profile_picture': (io.BytesIO(content), filename),
+        }, content_type='multipart/form-data')
+
+    # Two uploads of the same bytes under different names share one blob
+    upload(b'same image', 'IMG_0001.jpg')
+    first = db.session.get(User, test_user.id).profile_picture
+    upload(b'same image', 'holiday.JPG')
+    db.session.expire_all()
+    assert db.session.get(User, test_user.id).profile_picture == first
+    assert first == hashlib.sha256(b'same image').hexdigest() + '.jpg'
+    assert os.listdir(tmp_path) == [first]
+    assert os.stat(tmp_path / first).st_mode & 0o777 == 0o644
+
+    # Oversized uploads are rejected without leaving anything behind
+    response = upload(b'x' * 2048, 'huge.png')
+    assert b'Uploads are limited to 1 KB.' in response.data
+    assert os.listdir(tmp_path) == [first]
+
+    # Replacing the picture orphans the old blob, which the batch job removes
+    upload(b'new image', 'new.png')
+    result = runner.invoke(args=['uploads', 'prune', '--grace', '0'])
+    assert 'Removed 1 orphaned upload(s).' in result.output
+    assert os.listdir(tmp_path) == [hashlib.sha256(b'new image').hexdigest() + '.png']
+
+    # Storing an orphaned blob again makes it fresh, so a prune cannot race the uncommitted reference
+    name = store_upload(FileStorage(io.BytesIO(b'orphan'), 'orphan.gif'), str(tmp_path), 1024)
+    os.utime(os.path.join(tmp_path, name), (0, 0))
+    assert store_upload(FileStorage(io.BytesIO(b'orphan'), 'again.gif'), str(tmp_path), 1024) == name
+    runner.invoke(args=['uploads', 'prune', '--grace', '3600'])
+    assert os.path.exists(os.path.join(tmp_path, name))
+
+def test_static_assets_are_fingerprinted_and_immutable(app, client):
+    with app.test_request_context():
+        stylesheet = url_for('static', filename='css/styles.css')
+    assert re.fullmatch(r'/static/css/styles\.[0-9a-f]{12}\.css', stylesheet)
+    assert stylesheet.encode() in client.get('/').data
+
+    response = client.get(stylesheet, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert gzip.decompress(response.data) == open(os.path.join(app.static_folder, 'css', 'styles.css'), 'rb').read()
+
+    plain = client.get(stylesheet)
+    assert 'Content-Encoding' not in plain.headers
+    assert 'immutable' in plain.headers['Cache-Control']
+
+    # Unfingerprinted names are still served, just without the long-lived cache
+    assert 'immutable' not in client.get('/static/css/styles.css').headers.get('Cache-Control', '')
+
+def test_precompressed_assets_are_written_whole_and_world_readable(tmp_path):
+    (tmp_path / 'app.js').write_text('console.log(1);\n' * 100)
+    StaticAssets(str(tmp_path), str(tmp_path / 'uploads')).build()
+    assert sorted(os.listdir(tmp_path)) == ['app.js', 'app.js.gz']
+    assert gzip.decompress((tmp_path / 'app.js.gz').read_bytes()) == (tmp_path / 'app.js').read_bytes()
+    assert os.stat(tmp_path / 'app.js.gz').st_mode & 0o777 == 0o644
+
+def test_dashboard_and_edit_task_answer_conditional_gets(client):
+    test_user = User(username='refresher', email='refresher@example.com')
+    test_user.set_password('password123')
+    db.session.add(test_user)
+    db.session.commit()
+    task = Task(title='Watched', user_id=test_user.id)
+    db.session.add(task)
+    db.session.commit()
+
+    client.post('/login', data={
+        'login_identifier': 'refresher',
+        'password': 'password123'
+    })
+    client.get('/dashboard')  # Consume the login flash message
+
+    for url in ('/dashboard', f'/task/edit/{task.id}'):
+        etag = client.get(url).headers['ETag']
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+        # Any change to a visible task makes the old copy stale
+        client.patch(f'/api/v1/tasks/{task.id}', json={'priority': 'high' if url == '/dashboard' else 'low'})
+        response = client.get(url, headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+    # A new task shows up even though no existing row changed
+    etag = client.get('/dashboard').headers['ETag']
+    client.post('/api/v1/tasks', json={'title': 'New', 'priority': 'low', 'task_type': 'group'})
+    assert client.get('/dashboard', headers={'If-None-Match': etag}).status_code == 200
+
+def test_dashboard_event_stream_pushes_and_replays_task_deltas(app, client):
+    creator = User(username='streamer', email='streamer@example.com')
+    creator.set_password('password123')
+    helper = User(username='helper', email='helper@example.com', password_hash='x')
+    db.session.add_all([creator, helper])
+    db.session.commit()
+
+    client.post('/login', data={
+        'login_identifier': 'streamer',
+        'password': 'password123'
+    })
+
+    def read_events(response, count):
+        chunks = iter(response.response)
+        events = []
+        while len(events) < count:
+            chunk = next(chunks)
+            chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if chunk.startswith('id:'):
+                events.append(json.loads(chunk.split('data: ', 1)[1]))
+            elif chunk.startswith('event: reset'):
+                events.append('reset')
+        return events
+
+    broker = app.extensions['task_events']
+    task_id = client.post('/api/v1/tasks', json={'title': 'Live', 'priority': 'low', 'task_type': 'group',
+                                                 'assignee_id': helper.id}).get_json()['id']
+    client.post('/task/bulk/start', data={'task_ids': [task_id]})
+    client.patch('/api/v1/tasks/batch', json={'tasks': [{'id': task_id, 'priority': 'high'}]})
+
+    # A reconnecting client is replayed everything after its Last-Event-ID, with only changed fields
+    response = client.get('/dashboard/events', headers={'Last-Event-ID': str(broker.first_id - 1)}, buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    created, started, patched = read_events(response, 3)
+    assert created == {'action': 'created', 'task': {'id': task_id}}
+    assert started['action'] == 'updated' and set(started['task']) == {'id', 'start_time'}
+    assert patched['task'] == {'id': task_id, 'priority': 'high'}
+
+    # Changes made while connected arrive live; rolled-back ones never do
+    task = db.session.get(Task, task_id)
+    task.title = 'Discarded'
+    db.session.flush()
+    db.session.rollback()
+    client.post(f'/task/delete/{task_id}')
+    assert read_events(response, 1) == [{'action': 'deleted', 'task': {'id': task_id}}]
+    response.close()
+    assert not broker._subscribers
+
+    # The assignee was addressed too
+    assert [json.loads(event[2])['action'] for event in broker._history[helper.id]] == \
+        ['created', 'updated', 'updated', 'deleted']
+
+    # A client from before this process started must reload instead
+    response = client.get('/dashboard/events', headers={'Last-Event-ID': '1'}, buffered=False)
+    assert read_events(response, 1) == ['reset']
+    response.close()
+
+def test_reassignment_moves_the_card_between_assignees(app, client):
+    creator = User(username='delegator', email='delegator@example.com')
+    creator.set_password('password123')
+    first = User(username='first', email='first@example.com', password_hash='x')
+    second = User(username='second', email='second@example.com', password_hash='x')
+    db.session.add_all([creator, first, second])
+    db.session.commit()
+    client.post('/login', data={'login_identifier': 'delegator', 'password': 'password123'})
+
+    broker = app.extensions['task_events']
+    history = lambda user: [json.loads(event[2]) for event in broker._history[user.id]]
+    task_id = client.post('/api/v1/tasks', json={'title': 'Handover', 'priority': 'low', 'task_type': 'group',
+                                                 'assignee_id': first.id}).get_json()['id']
+
+    # The new assignee has no card to update, so is sent one to fetch; the old one drops it
+    client.patch(f'/api/v1/tasks/{task_id}', json={'assignee_id': second.id})
+    assert history(second) == [{'action': 'created', 'task': {'id': task_id}}]
+    assert history(first)[-1] == {'action': 'deleted', 'task': {'id': task_id}}
+    assert history(creator)[-1]['task']['assignee'] == 'second'
+
+    # The bulk UPDATE path does the same
+    client.patch('/api/v1/tasks/batch', json={'tasks': [{'id': task_id, 'assignee_id': first.id}]})
+    assert [event['action'] for event in history(first)] == ['created', 'deleted', 'created']
+    assert [event['action'] for event in history(second)] == ['created', 'deleted']
+
+def test_full_text_search_is_ranked_scoped_and_kept_in_sync(client):
+    searcher = User(username='seeker', email='seeker@example.com')
+    searcher.set_password('password123')
+    stranger = User(username='hidden', email='hidden@example.com', password_hash='x')
+    db.session.add_all([searcher, stranger])
+    db.session.commit()
+    db.session.add_all([
+        Task(title='Quarterly report', description='Numbers for finance', user_id=searcher.id),
+        Task(title='Team lunch', description='Collect the report on dietary needs', user_id=searcher.id),
+        Task(title='Secret report', user_id=stranger.id),
+    ])
+    db.session.commit()
+
+    client.post('/login', data={
+        'login_identifier': 'seeker',
+        'password': 'password123'
+    })
+
+    def titles(query):
+        response = client.get('/api/v1/tasks/search', query_string={'q': query})
+        return [task['title'] for task in response.get_json()['tasks']]
+
+    # Title matches rank first, other users' tasks never appear, and words are stemmed and prefix-matched
+    assert titles('reports') == ['Quarterly report', 'Team lunch']
+    assert titles('quart') == ['Quarterly report']
+    assert titles('report" (') == ['Quarterly report', 'Team lunch']  # Operators are treated as words
+    assert titles('!!!') == []
+
+    # Rows written by bulk statements are indexed by the triggers
+    client.post('/api/v1/tasks/batch', json={'tasks': [
+        {'title': 'Expense claims', 'priority': 'low', 'task_type': 'group'}
+    ]})
+    assert titles('expense') == ['Expense claims']
+    task_id = client.get('/api/v1/tasks/search?q=lunch').get_json()['tasks'][0]['id']
+    client.patch('/api/v1/tasks/batch', json={'tasks': [{'id': task_id, 'title': 'Team dinner'}]})
+    assert titles('lunch') == [] and titles('dinner') == ['Team dinner']
+    client.delete('/api/v1/tasks/batch', json={'ids': [task_id]})
+    assert titles('dinner') == []
+
+    response = client.get('/tasks/search?q=quarterly')
+    assert b'Quarterly report' in response.data and b'Expense claims' not in response.data
+
+    # The admin list filters through the same index
+    admin_view = next(view for view in client.application.extensions['admin'][0]._views
+                      if getattr(view, 'model', None) is Task)
+    count, rows = admin_view.get_list(0, None, False, 'report', None)
+    assert count == 2 and {task.title for task in rows} == {'Quarterly report', 'Secret report'}
+
+def test_rollups_follow_task_changes_and_match_backfill(app, client, runner):
+    worker = User(username='worker', email='worker@example.com', department='Ops')
+    worker.set_password('password123')
+    colleague = User(username='colleague', email='colleague@example.com', password_hash='x', department='Sales')
+    db.session.add_all([worker, colleague])
+    db.session.commit()
+
+    client.post('/login', data={
+        'login_identifier': 'worker',
+        'password': 'password123'
+    })
+
+    def rollups():
+        return {(row.user_id, row.department, row.day): (row.completed, round(row.duration_seconds))
+                for row in db.session.scalars(db.select(TaskRollup)) if row.completed}
+
+    def assert_matches_backfill():
+        incremental = rollups()
+        result = runner.invoke(args=['rollups', 'backfill'])
+        assert 'rollup row(s)' in result.output
+        assert rollups() == incremental
+        return incremental
+
+    started = datetime.utcnow() - timedelta(hours=2)
+    tasks = [Task(title=f'Timed {i}', user_id=worker.id, start_time=started) for i in range(3)]
+    db.session.add_all(tasks)
+    db.session.commit()
+    ids = [task.id for task in tasks]
+
+    client.post(f'/task/complete/{ids[0]}')
+    client.post(f'/end_task/{ids[1]}')
+    client.post('/task/bulk/complete', data={'task_ids': [ids[2]]})
+    today = datetime.utcnow().date()
+    assert assert_matches_backfill() == {(worker.id, 'Ops', today): (3, 3 * 7200)}
+
+    # A repeated id neither removes nor counts a task twice
+    assert client.delete('/api/v1/tasks/batch', json={'ids': [ids[1], ids[1]]}).status_code == 400
+    assert client.patch('/api/v1/tasks/batch', json={'tasks': [{'id': ids[1], 'assignee_id': colleague.id}] * 2}
+                        ).status_code == 400
+    assert rollups() == {(worker.id, 'Ops', today): (3, 3 * 7200)}
+
+    # Reassigning a completed task moves it; deleting it removes it
+    client.patch('/api/v1/tasks/batch', json={'tasks': [{'id': ids[0], 'assignee_id': colleague.id}]})
+    client.post(f'/task/delete/{ids[1]}')
+    assert assert_matches_backfill() == {
+        (worker.id, 'Ops', today): (1, 7200),
+        (colleague.id, 'Sales', today): (1, 7200),
+    }
+
+    # Editing the times moves the task to another day
+    tomorrow = (datetime.utcnow() + timedelta(days=1)).replace(second=0, microsecond=0)
+    response = client.patch(f'/api/v1/tasks/{ids[2]}', json={
+        'start_time': (tomorrow - timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M'),
+        'end_time': tomorrow.strftime('%Y-%m-%dT%H:%M'),
+    })
+    assert response.status_code == 200
+    client.delete('/api/v1/tasks/batch', json={'ids': [ids[0]]})
+    assert assert_matches_backfill() == {(worker.id, 'Ops', tomorrow.date()): (1, 3600)}
+
+    week = tomorrow.date() - timedelta(days=tomorrow.weekday())
+    assert [(row.username, row.completed, row.hours) for row in hours_report(week)] == [('worker', 1, 1.0)]
+
+    # After a department change the task still comes off the row it was counted in
+    db.session.get(User, worker.id).department = 'IT'
+    db.session.commit()
+    client.post(f'/task/delete/{ids[2]}')
+    assert rollups() == {}
+
+def test_status_and_duration_filter_and_sort_in_sql(app, client):
+    test_user = User(username='sorter', email='sorter@example.com')
+    test_user.set_password('password123')
+    db.session.add(test_user)
+    db.session.commit()
+    started = datetime.utcnow() - timedelta(hours=10)
+    tasks = [Task(title=f'Took {hours}h', user_id=test_user.id, start_time=started,
+                  end_time=started + timedelta(hours=hours)) for hours in (1, 5, 3, 8)]
+    tasks += [Task(title='Open', user_id=test_user.id), Task(title='Running', user_id=test_user.id)]
+    db.session.add_all(tasks)
+    db.session.commit()
+
+    client.post('/login', data={
+        'login_identifier': 'sorter',
+        'password': 'password123'
+    })
+
+    # The routes and bulk UPDATEs keep the materialised status in step with the times
+    client.post(f'/task/start/{tasks[5].id}')
+    client.post('/task/bulk/start', data={'task_ids': [tasks[4].id]})
+    client.post('/task/bulk/complete', data={'task_ids': [tasks[4].id]})
+    db.session.expire_all()
+    assert [task.status for task in tasks] == ['done'] * 5 + ['in_progress']
+    assert db.session.scalar(db.select(db.func.count()).where(Task.status == 'done')) == 5
+
+    # Keyset pages sorted by duration, longest first, with the same cursor rules as the default order
+    def titles(**params):
+        seen, after = [], None
+        while True:
+            response = client.get('/api/v1/tasks', query_string=dict(params, limit=2, **({'after': after} if after else {})))
+            body = response.get_json()
+            seen += [task['title'] for task in body['tasks']]
+            if not body['next']:
+                return seen
+            after = body['next']
+
+    assert titles(sort='duration')[:4] == ['Took 8h', 'Took 5h', 'Took 3h', 'Took 1h']
+    assert titles(sort='duration', min_hours=3) == ['Took 8h', 'Took 5h', 'Took 3h']
+    assert titles(sort='status')[0] == 'Running'
+    response = client.get('/dashboard?sort=duration&min_hours=4')
+    assert b'Took 8h' in response.data and b'Took 3h' not in response.data
+
+    # The admin list sorts and filters on the same expressions
+    admin_view = next(view for view in app.extensions['admin'][0]._views if getattr(view, 'model', None) is Task)
+    filters = [(index, flt.name, 7200) for index, flt in enumerate(admin_view._filters)
+               if flt.name == 'Duration (s)' and flt.operation() == 'greater than']
+    count, rows = admin_view.get_list(0, 'duration_seconds', True, None, filters)
+    assert [task.title for task in rows] == ['Took 8h', 'Took 5h', 'Took 3h']
+
+def test_admin_task_list_is_bounded_and_bulk_actions_are_set_based(app, client):
+    admin_user = User(username='admin', email='admin@example.com', is_admin=True)
+    admin_user.set_password('password123')
+    helpers = [User(username=f'helper{i}', email=f'helper{i}@example.com', password_hash='x') for i in range(5)]
+    db.session.add_all([admin_user] + helpers)
+    db.session.commit()
+    finished = datetime.utcnow()
+    tasks = [Task(title=f'Admin {i}', user_id=helpers[i % 5].id, assignee_id=helpers[(i + 1) % 5].id,
+                  start_time=finished - timedelta(hours=1), end_time=finished) for i in range(30)]
+    db.session.add_all(tasks)
+    db.session.commit()
+    ids = [task.id for task in tasks]
+
+    client.post('/login', data={
+        'login_identifier': 'admin',
+        'password': 'password123'
+    })
+
+    def list_statements():
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            response = client.get('/admin/task/')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+        assert response.status_code == 200 and b'helper3' in response.data
+        return statements
+
+    # Creators and assignees arrive with the page, and the pager's count is reused
+    first = list_statements()
+    assert len(first) <= 3 and any('count(' in statement.lower() for statement in first)
+    second = list_statements()
+    assert len(second) == len(first) - 1 and not any('count(' in statement.lower() for statement in second)
+
+    def run_action(action, task_ids):
+        return client.post('/admin/task/action/', data={'action': action, 'rowid': task_ids})
+
+    response = run_action('reassign', ids[:10])
+    assert response.status_code == 302
+    client.post(response.location, data={'ids': ','.join(map(str, ids[:10])), 'assignee_id': admin_user.id})
+    reassigned = [json.loads(event[2]) for event in app.extensions['task_events']._history[admin_user.id]]
+    assert reassigned == [{'action': 'created', 'task': {'id': task_id}} for task_id in ids[:10]]
+    response = run_action('priority', ids[:20])
+    client.post(response.location, data={'ids': ','.join(map(str, ids[:20])), 'priority': 'high'})
+    run_action('delete', ids[20:])
+
+    assert db.session.scalar(db.select(db.func.count(Task.id)).where(Task.assignee_id == admin_user.id)) == 10
+    assert db.session.scalar(db.select(db.func.count(Task.id)).where(Task.priority == 'high')) == 20
+    assert db.session.scalar(db.select(db.func.count(Task.id))) == 20
+    counted = db.session.scalars(db.select(TaskRollup.completed).where(TaskRollup.user_id == admin_user.id)).all()
+    assert counted == [10]
+    assert db.session.scalar(db.select(db.func.sum(TaskRollup.completed))) == 20
+
+def test_admin_exports_stream_filtered_csv_and_ndjson(app, client):
+    admin_user = User(username='admin', email='admin@example.com', department='IT')
+    admin_user.set_password('password123')
+    ops = User(username='opsie', email='opsie@example.com', password_hash='secret-hash', department='Ops')
+    sales = User(username='seller', email='seller@example.com', password_hash='secret-hash', department='Sales')
+    db.session.add_all([admin_user, ops, sales])
+    db.session.commit()
+    db.session.add_all([Task(title=f'Ops {i}', user_id=admin_user.id, assignee_id=ops.id) for i in range(1200)] + [
+        Task(title='Sales, "quoted"', description='=HYPERLINK("http://evil.example")', user_id=sales.id),
+        Task(title='Old', user_id=ops.id, date_created=datetime(2020, 1, 1)),
+    ])
+    db.session.commit()
+
+    client.post('/login', data={
+        'login_identifier': 'admin',
+        'password': 'password123'
+    })
+
+    response = client.get('/admin/export/?dataset=tasks&format=csv&department=Sales')
+    assert response.is_streamed and response.mimetype == 'text/csv'
+    assert 'attachment' in response.headers['Content-Disposition']
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0].startswith('id,title,description,priority')
+    assert len(lines) == 2 and '"Sales, ""quoted"""' in lines[1]
+    # Text a spreadsheet would evaluate is exported inert
+    assert '"\'=HYPERLINK(""http://evil.example"")"' in lines[1]
+
+    response = client.get('/admin/export/?dataset=tasks&format=ndjson&department=Ops&since=2021-01-01')
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(records) == 1200 and records[0]['assignee'] == 'opsie' and records[0]['department'] == 'Ops'
+    response = client.get('/admin/export/?dataset=tasks&format=ndjson&until=2020-01-01')
+    assert [json.loads(line)['title'] for line in response.get_data(as_text=True).splitlines()] == ['Old']
+    response = client.get(f'/admin/export/?dataset=tasks&format=csv&assignee_id={ops.id}')
+    assert len(response.get_data(as_text=True).splitlines()) == 1201
+
+    response = client.get('/admin/export/?dataset=users&format=ndjson')
+    users = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [user['username'] for user in users] == ['admin', 'opsie', 'seller']
+    assert 'password_hash' not in users[0] and b'secret-hash' not in response.data
+
+def test_import_users_and_tasks_in_chunks_with_checkpoint(app, runner, tmp_path):
+    existing = User(username='taken', email='taken@example.com', password_hash='x')
+    db.session.add(existing)
+    db.session.commit()
+
+    users = tmp_path / 'users.csv'
+    users.write_text(
+        'username,email,password,department\n'
+        'alice,alice@example.com,secret1,Ops\n'
+        'taken,new@example.com,secret2,Ops\n'
+        'bob,bob@example.com,secret3,\n'
+        'bob,bob2@example.com,secret4,Ops\n'
+    )
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        result = runner.invoke(args=['import', 'users', str(users), '--chunk-size', '10'])
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+    assert result.exit_code == 0, result.output
+    assert 'rows/sec' in result.output
+    assert 'Record 2 skipped: username taken already exists' in result.output
+    assert 'Record 4 skipped: username bob already exists' in result.output
+    # One uniqueness lookup and one insert for the whole chunk
+    assert sum(statement.lstrip().startswith('INSERT INTO user') for statement in statements) == 1
+    assert sum('FROM user' in statement for statement in statements) == 1
+    alice = User.query.filter_by(username='alice').one()
+    assert alice.check_password('secret1') and alice.department == 'Ops'
+    assert User.query.filter_by(username='bob').one().department == 'Unknown'
+    assert not os.path.exists(str(users) + '.checkpoint')
+
+    done = datetime.utcnow().replace(microsecond=0)
+    tasks = tmp_path / 'tasks.ndjson'
+    tasks.write_text(''.join(json.dumps(record) + '\n' for record in [
+        {'title': 'Imported 1', 'creator': 'alice'},
+        {'title': 'Imported 2', 'creator': 'alice', 'assignee': 'bob',
+         'start_time': (done - timedelta(hours=2)).isoformat(), 'end_time': done.isoformat()},
+        {'title': 'Imported 3', 'creator': 'nobody'},
+        {'title': 'Imported 4', 'creator': 'bob', 'start_time': done.isoformat()},
+    ]))
+    # A checkpoint from an interrupted run skips the records already imported
+    checkpoint = str(tasks) + '.checkpoint'
+    with open(checkpoint, 'w') as saved:
+        json.dump({'source': str(tasks), 'size': tasks.stat().st_size, 'done': 1}, saved)
+    result = runner.invoke(args=['import', 'tasks', str(tasks), '--chunk-size', '2'])
+    assert result.exit_code == 0, result.output
+    assert 'Resuming after record 1.' in result.output
+    assert 'Record 3 skipped: unknown creator nobody' in result.output
+    assert not os.path.exists(checkpoint)
+
+    imported = {task.title: task for task in Task.query}
+    assert sorted(imported) == ['Imported 2', 'Imported 4']
+    bob = User.query.filter_by(username='bob').one()
+    assert imported['Imported 2'].assignee_id == bob.id and imported['Imported 2'].status == 'done'
+    assert imported['Imported 4'].status == 'in_progress'
+    assert [(row.user_id, row.completed, row.duration_seconds) for row in TaskRollup.query] == [(bob.id, 1, 7200.0)]
+
+    # NDJSON lines that are not objects of text fields are rejected, not fatal
+    malformed = tmp_path / 'malformed.ndjson'
+    malformed.write_text('[1, 2]\n"x"\n{"username": 7, "email": "n@example.com", "password": "p"}\n'
+                         '{"username": "carol", "email": "carol@example.com", "password": "secret5"}\n'
+                         '{"username": "dan", "email": "dan@exa\n'
+                         '{"username": "erin", "email": "erin@example.com", "password": "p", "phone_number": "'
+                         + '5' * 16 + '"}\n')
+    result = runner.invoke(args=['import', 'users', str(malformed)])
+    assert result.exit_code == 0, result.output
+    assert 'Record 1 skipped: not an object' in result.output
+    assert 'Record 2 skipped: not an object' in result.output
+    assert 'Record 3 skipped: username must be text' in result.output
+    assert 'Record 5 skipped: invalid JSON' in result.output
+    assert 'Record 6 skipped: phone_number is longer than 15 characters' in result.output
+    assert User.query.filter_by(username='carol').one().check_password('secret5')
+
+    # A checkpoint for a file that has since changed is refused
+    with open(checkpoint, 'w') as saved:
+        json.dump({'source': str(tasks), 'size': 1, 'done': 1}, saved)
+    result = runner.invoke(args=['import', 'tasks', str(tasks)])
+    assert result.exit_code != 0 and '--restart' in result.output
+
+def test_route_benchmark_query_counts_stay_within_baseline():
+    # Query counts do not depend on the dataset size, so a small seed is enough to gate on them
+    app = route_benchmark.make_app()
+    with app.app_context():
+        db.create_all()
+        fresh_ids = route_benchmark.seed(users=20, tasks=300, fresh=3)
+    results = route_benchmark.run(app, fresh_ids)
+
+    with open(route_benchmark.BASELINE) as stored:
+        baseline = json.load(stored)['routes']
+    assert sorted(results) == sorted(baseline)
+    for result in results.values():
+        assert result['requests'] == 3 and result['p50_ms'] <= result['p95_ms'] <= result['p99_ms']
+    assert route_benchmark.compare(results, baseline, tolerance=0, same_dataset=False) == []
+
+    slower = dict(results, login=dict(results['login'], queries=baseline['login']['queries'] + 1))
+    assert route_benchmark.compare(slower, baseline, tolerance=0, same_dataset=False) == [
+        f"login: {baseline['login']['queries'] + 1} queries per request, baseline {baseline['login']['queries']}"
+    ]
+
+def test_load_driver_runs_scripted_sessions_and_summarizes_per_route(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'load.db'}"
+    load_driver.prepare_database('sqlite-wal', database_url)
+    elapsed, samples = load_driver.run(('app', ('sqlite-wal', database_url)), concurrency=2, seconds=0.5)
+
+    summary = load_driver.summarize(elapsed, samples)
+    assert {'register', 'login', 'dashboard GET', 'dashboard POST', 'start_task', 'end_task'} <= set(summary)
+    assert summary['register']['requests'] == 2
+    for result in summary.values():
+        assert not result['errors']
+        assert result['p50_ms'] <= result['p95_ms'] <= result['p99_ms']
+    assert load_driver.error_label(500, 'OperationalError: database is locked') == 'database is locked'
+
+def test_metrics_record_latency_queries_hashing_and_throttle(app, client):
+    app.extensions['login_throttle'].limits['identifier'] = (1, 1)
+    for username in ('admin', 'member'):
+        user = User(username=username, email=f'{username}@example.com')
+        user.set_password('password123')
+        db.session.add(user)
+    db.session.commit()
+
+    client.post('/login', data={'login_identifier': 'member', 'password': 'password123'})
+    assert client.get('/dashboard').status_code == 200
+    assert client.get('/metrics').status_code == 403
+    client.get('/logout')
+    client.post('/login', data={'login_identifier': 'member', 'password': 'wrong'})  # Over the limit
+
+    app.config['METRICS_TOKEN'] = 'scrape-me'
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer t\u00e9'}).status_code == 403
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-me'})
+    assert response.status_code == 200 and response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert 'wfhome_http_responses_total{endpoint="tasks.dashboard",method="GET",status="200"} 1' in text
+    assert 'wfhome_http_responses_total{endpoint="auth.login",method="POST",status="429"} 1' in text
+    assert 'wfhome_http_request_duration_seconds_count{endpoint="tasks.dashboard",method="GET"} 1' in text
+    assert 'wfhome_db_queries_per_request_bucket{endpoint="tasks.dashboard",le="+Inf"} 1' in text
+    assert 'wfhome_db_query_seconds_total{endpoint="tasks.dashboard"}' in text
+    # Two hashes when creating the users and one verified login; the throttled attempt never hashed
+    assert 'wfhome_password_hash_duration_seconds_count{operation="hash"} 2' in text
+    assert 'wfhome_password_hash_duration_seconds_count{operation="verify"} 1' in text
+    assert 'wfhome_login_throttle_rejections_total{kind="identifier"} 1' in text
+
+    client.post('/login', data={'login_identifier': 'admin', 'password': 'password123'})
+    assert client.get('/metrics').status_code == 200
+
+    # Counts are written as integers and other values at full precision
+    app.extensions['metrics'].query_seconds.inc(('precise',), 1234.56789)
+    lines = app.extensions['metrics'].render().splitlines()
+    assert 'wfhome_db_query_seconds_total{endpoint="precise"} 1234.56789' in lines
+    assert 'wfhome_login_throttle_rejections_total{kind="identifier"} 1' in lines
+
+    # Or on a port of their own, without any login
+    server = serve_metrics(app, '127.0.0.1', 0)
+    try:
+        with urlopen(f'http://127.0.0.1:{server.server_port}/') as scraped:
+            assert 'wfhome_http_responses_total' in scraped.read().decode()
+    finally:
+        server.shutdown()
+
+def test_query_debug_fails_n_plus_one_and_logs_slow_queries_with_plan(app, client, caplog):
+    owner = User(username='owner', email='owner@example.com', password_hash='x')
+    helpers = [User(username=f'helper{i}', email=f'helper{i}@example.com', password_hash='x') for i in range(12)]
+    db.session.add_all([owner] + helpers)
+    db.session.commit()
+    db.session.add_all([Task(title=f'Task {i}', user_id=owner.id, assignee_id=helper.id)
+                        for i, helper in enumerate(helpers)])
+    db.session.commit()
+    db.session.expunge_all()
+
+    @app.route('/lazy-assignees')
+    def lazy_assignees():
+        return ','.join(task.assignee.username for task in Task.query.all())  # One lazy load per task
+
+    with pytest.raises(RepeatedQueryError, match=r'(?s)lazy_assignees GET .*12 x SELECT .* FROM user WHERE user\.id = \?'):
+        client.get('/lazy-assignees')
+
+    assert fingerprint("SELECT * FROM task WHERE id IN (?, ?, ?) AND title = 'x''y' LIMIT 20") == \
+        fingerprint('SELECT * FROM task\n WHERE id IN (?) AND title = ? LIMIT 5')
+
+    app.config['SLOW_QUERY_SECONDS'] = 0
+    with caplog.at_level('WARNING', logger='querylog'):
+        db.session.expunge_all()
+        app.config['QUERY_REPEAT_ACTION'] = 'warn'
+        client.get('/lazy-assignees')
+    slow = [record.getMessage() for record in caplog.records if record.getMessage().startswith('Slow query')]
+    assert slow and all('lazy_assignees GET' in message for message in slow)
+    assert any('SEARCH user USING INTEGER PRIMARY KEY' in message for message in slow)
+    assert any('likely N+1' in record.getMessage() for record in caplog.records)
+
+    # DDL is never explained, since a failed EXPLAIN aborts the transaction on PostgreSQL
+    with db.engine.connect() as connection:
+        assert explain(connection, 'CREATE TABLE scratch (id INTEGER)', ()) == '(not a query; not explained)'
+        assert 'SCAN' in explain(connection, '  select * from task', ())
+
+def test_admin_is_optional_and_models_import_without_ui_dependencies():
+    # Which modules load is deterministic, unlike the timings the startup benchmark budgets
+    for name in ('import models', 'create_app without admin'):
+        code, _, forbidden = startup.CASES[name]
+        assert startup.run_case(code, forbidden)[1] == []
+
+    app = create_app(type('NoAdmin', (TestingConfig,), {'ADMIN_ENABLED': False}))
+    assert 'admin' not in app.blueprints
+    assert app.test_client().get('/admin/').status_code == 404
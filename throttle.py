@@ -0,0 +1,125 @@
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from flask import current_app
+
+def _refill(tokens, updated, burst, rate, now):
+    """Tokens in a bucket at `now`, given its last state and refill rate (tokens/sec)."""
+    return min(burst, tokens + (now - updated) * rate)
+
+class MemoryBucketStore:
+    """Token buckets held in this process only, at most `max_keys` of them.
+
+    Buckets are kept in the order they were last used, so the ones that have
+    refilled, and past the limit the least recently used, are dropped from
+    the front a few at a time rather than by rebuilding the whole store.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # key -> (tokens, updated, time the bucket is full again)
+
+    def take(self, key, burst, rate, now):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = _refill(bucket[0], bucket[1], burst, rate, now) if bucket else burst
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            self._buckets.move_to_end(key)
+            # Buckets that have refilled completely carry no state worth keeping
+            while self._buckets and next(iter(self._buckets.values()))[2] <= now:
+                self._buckets.popitem(last=False)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed
+
+class SQLiteBucketStore:
+    """Token buckets in a SQLite file, shared by every worker process on the host.
+
+    Rows untouched for `max_idle` seconds, longer than any limit takes to
+    refill, are deleted at most once every `prune_interval` seconds.
+    """
+
+    def __init__(self, path, max_idle=3600, prune_interval=60):
+        self.path = path
+        self.max_idle = max_idle
+        self.prune_interval = prune_interval
+        self._pruned = 0.0
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS login_bucket '
+                               '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS login_bucket_updated ON login_bucket (updated)')
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, burst, rate, now):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tokens, updated FROM login_bucket WHERE key = ?', (key,)).fetchone()
+            tokens = _refill(*row, burst, rate, now) if row else burst
+            allowed = tokens >= 1
+            connection.execute(
+                'INSERT INTO login_bucket (key, tokens, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                (key, tokens - 1 if allowed else tokens, now)
+            )
+            if now - self._pruned >= self.prune_interval:
+                self._pruned = now
+                connection.execute('DELETE FROM login_bucket WHERE updated < ?', (now - self.max_idle,))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return allowed
+
+class LoginThrottle:
+    """Token-bucket limits on login attempts per client address and per login identifier.
+
+    Each limit is a (burst, per_minute) pair. Rejections are counted by kind in
+    `rejections` so they can be reported as metrics.
+    """
+
+    def __init__(self, store, client_limit, identifier_limit):
+        self.store = store
+        self.limits = {'client': client_limit, 'identifier': identifier_limit}
+        self.rejections = Counter()
+        self._lock = threading.Lock()
+
+    def allow(self, remote_addr, identifier):
+        """Consume one attempt for the client and the identifier; False if either is exhausted."""
+        now = time.time()
+        keys = (('client', remote_addr or 'unknown'), ('identifier', identifier.strip().lower()))
+        for kind, value in keys:
+            burst, per_minute = self.limits[kind]
+            if not self.store.take(f'{kind}:{value}', burst, per_minute / 60.0, now):
+                with self._lock:
+                    self.rejections[kind] += 1
+                return False
+        return True
+
+def login_throttle():
+    """Return the login throttle for the current app (None when disabled)."""
+    return current_app.extensions.get('login_throttle')
+
+def init_throttle(app):
+    """Attach a LoginThrottle built from the LOGIN_THROTTLE_* settings."""
+    if not app.config['LOGIN_THROTTLE_ENABLED']:
+        return
+    path = app.config['LOGIN_THROTTLE_STORE']
+    store = SQLiteBucketStore(path) if path else MemoryBucketStore()
+    app.extensions['login_throttle'] = LoginThrottle(
+        store,
+        client_limit=app.config['LOGIN_THROTTLE_CLIENT_LIMIT'],
+        identifier_limit=app.config['LOGIN_THROTTLE_IDENTIFIER_LIMIT'],
+    )
@@ -0,0 +1,75 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+CHUNK_SIZE = 64 * 1024
+
+# Stored uploads are named "<sha256 of the content>.<extension>"
+CONTENT_NAME = re.compile(r'^[0-9a-f]{64}\.(?:png|jpg|jpeg|gif)$')
+TEMP_PREFIX = '.upload-'
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds the configured byte limit."""
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def store_upload(file, folder, max_bytes):
+    """Stream an uploaded file to disk under its content hash and return the stored name.
+
+    The file is written to a temporary file in `folder` while it is hashed, so
+    it is never held in memory, and the upload is abandoned as soon as it
+    passes `max_bytes`. Identical images share one blob: if the hash is already
+    stored the temporary copy is simply discarded and the blob's mtime refreshed.
+    """
+    os.makedirs(folder, exist_ok=True)
+    extension = file.filename.rsplit('.', 1)[1].lower()
+    digest = hashlib.sha256()
+    size = 0
+
+    descriptor, temp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=folder)
+    try:
+        with os.fdopen(descriptor, 'wb') as temp_file:
+            while chunk := file.stream.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f'Uploads are limited to {max_bytes // 1024} KB.')
+                digest.update(chunk)
+                temp_file.write(chunk)
+
+        filename = f'{digest.hexdigest()}.{extension}'
+        target = os.path.join(folder, filename)
+        try:
+            # Restart the prune grace period, since the new reference is not committed yet
+            os.utime(target)
+            os.remove(temp_path)
+        except FileNotFoundError:
+            os.chmod(temp_path, 0o644)  # mkstemp's 0600 would hide it from a separate static server
+            os.replace(temp_path, target)  # Atomic, so readers never see a partial blob
+        return filename
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def prune_uploads(folder, referenced, grace_seconds):
+    """Delete content-addressed blobs no longer referenced, plus abandoned temporary files.
+
+    Only files older than `grace_seconds` are removed, so an upload whose
+    profile change has not been committed yet is left alone. Files that do
+    not follow the content-hash naming scheme are never touched. Returns the
+    number of files removed.
+    """
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            orphaned = CONTENT_NAME.match(entry.name) and entry.name not in referenced
+            abandoned = entry.name.startswith(TEMP_PREFIX)
+            if (orphaned or abandoned) and entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+    return removed